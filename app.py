@@ -1,6 +1,13 @@
+import os
+import uuid
 import streamlit as st
+import mediapipe as mp
 from trainer.exercise_analysis import ExerciseAnalyzer
-from trainer.utils import process_uploaded_video
+from trainer.utils import process_uploaded_video, probe_video
+from trainer.progressive import process_uploaded_video_progressive
+from trainer.params import recognition_params
+from trainer.prefetch import ModelPrefetcher
+from trainer.governor import ResourceGovernor
 from streamlit_webrtc import webrtc_streamer, WebRtcMode, RTCConfiguration
 from utils import VideoProcessor
 from io import BytesIO
@@ -8,6 +15,28 @@ from io import BytesIO
 # Get API
 api_endpoint = st.secrets["API_ENDPOINT"]
 
+# Directory for recorded webcam sessions
+recording_dir = "/tmp/sessions"
+
+# Seconds a new webcam session waits for a free slot before it is rejected
+session_queue_timeout = 10
+
+# Share the CPU between the webcam sessions of the server process, before TensorFlow runs anything
+@st.cache_resource
+def get_governor():
+    governor = ResourceGovernor()
+    governor.configure_tensorflow()
+    return governor
+
+governor = get_governor()
+
+# Prefetch and warm up all models once per server process, in the background
+@st.cache_resource
+def start_model_prefetch(api_endpoint):
+    return ModelPrefetcher(api_endpoint).start()
+
+start_model_prefetch(api_endpoint)
+
 # Initialize session state flags
 if "selected_exercise_id" not in st.session_state:
     st.session_state.selected_exercise_id = None
@@ -21,9 +50,17 @@ exercise_mapping = {
     "Deadlift": 3,
     "Jumping Jack": 4,
     "Plank": 5,
-    "Push up": 6
+    "Push up": 6,
+    "Recognize my exercise": recognition_params['ExerciseID']
 }
 
+# Show which models are ready
+def render_model_status():
+    with st.sidebar.expander("Model Status"):
+        for name, status in ModelPrefetcher.get_readiness().items():
+            icon = "✅" if status == "ready" else "❌" if status == "failed" else "⏳"
+            st.write(f"{icon} {name}: {status}")
+
 # Control which page is visible
 def render_page():
     # Main Page
@@ -38,6 +75,8 @@ def render_page():
     elif st.session_state.current_page == "exercise_start":
         render_exercise_start_page()
 
+    render_model_status()
+
 # Main Page
 def render_main_page():
     _, col2, _ = st.columns([0.5, 1, 0.3])  # Adjust column ratios as needed
@@ -100,10 +139,66 @@ def render_exercise_selection_page():
                 st.session_state.current_page = "exercise_start"
                 st.experimental_rerun()
 
+    _, col2, _ = st.columns([1, 1, 1])
+    with col2:
+        if st.button("Recognize my exercise", key="exercise_recognition"):
+            st.session_state.selected_exercise_id = exercise_mapping["Recognize my exercise"]
+            st.session_state.current_page = "exercise_start"
+            st.experimental_rerun()
+
     with st.sidebar:
         st.button("Home", on_click=lambda: setattr(st.session_state, "current_page", "main"))
 
 
+# Session Summary
+def render_session_summary(summary):
+    if not summary or not summary["frames"]:
+        st.info("No analyzed frames yet.")
+        return
+
+    st.subheader("Session Summary")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Reps", summary["reps"])
+    col2.metric("Mean Score", f"{int(summary['mean_score'])}%")
+    col3.metric("Time under Tension", f"{summary['time_under_tension']:.1f} s")
+
+    joint_name = lambda joint_id: mp.solutions.pose.PoseLandmark(joint_id).name.replace("_", " ").title()
+    st.write(f"Joint to focus on: **{joint_name(summary['worst_joint'])}**")
+
+    if summary["rep_details"]:
+        st.table([{"Rep": rep["rep"],
+                   "Duration [s]": round(rep["duration"], 1),
+                   "Score [%]": int(rep["score"]),
+                   "Worst Joint": joint_name(rep["worst_joint"])} for rep in summary["rep_details"]])
+
+# Process an upload while showing the progress, the live totals and the latest processed segment
+def render_progressive_processing(input_video_bytes, exercise, start_time, end_time, analysis_fps):
+    progress_bar = st.progress(0.0, text="Processing video...")
+    col1, col2, col3 = st.columns(3)
+    reps_metric = col1.empty()
+    score_metric = col2.empty()
+    feedback_metric = col3.empty()
+    preview = st.empty()
+
+    def on_progress(progress):
+        eta = f", {progress['eta_seconds']:.0f} s left" if progress["eta_seconds"] is not None else ""
+        progress_bar.progress(progress["progress"],
+                              text=f"Processed {progress['frames_processed']} of {progress['total_frames']} frames "
+                                   f"at {progress['fps']:.1f} fps{eta}")
+        reps_metric.metric("Reps", progress["reps"] if progress["reps"] is not None else "-")
+        score_metric.metric("Mean Score", f"{progress['mean_score']:.0f}%" if progress["mean_score"] is not None else "-")
+        if progress["time_to_first_feedback"] is not None:
+            feedback_metric.metric("First Feedback", f"{progress['time_to_first_feedback']:.1f} s")
+        if progress["segment"]:
+            # The segment files are removed after processing, show them from memory
+            with open(progress["segment"], "rb") as f:
+                preview.video(f.read())
+
+    result = process_uploaded_video_progressive(input_video_bytes, exercise, progress_callback=on_progress,
+                                                start_time=start_time, end_time=end_time, analysis_fps=analysis_fps)
+    progress_bar.empty()
+    return result
+
 # Exercise Start Page
 def render_exercise_start_page():
     exercise_implemented = True
@@ -122,6 +217,10 @@ def render_exercise_start_page():
         with col2:
             st.title("Deadlift")
             st.image("https://hips.hearstapps.com/hmg-prod/images/workouts/2016/03/barbelldeadlift-1457038089.gif?resize=1200:*", width=400)
+    elif selected_exercise == recognition_params['ExerciseID']:
+        with col2:
+            st.title("Exercise Recognition")
+            st.subheader("Start your exercise, your Tr_AI_ner will recognize it")
     else:
         with col2:
             st.title("ERROR 404")
@@ -180,7 +279,41 @@ def render_exercise_start_page():
                 step=1
             )
 
+            prediction_stride = st.slider(
+                "Prediction Stride (run the model every k-th frame)",
+                min_value=1,
+                max_value=5,
+                value=1,
+                step=1
+            )
+
+            adaptive_stride = st.checkbox(
+                "Adaptive Prediction Stride (predict every frame while the error is high)",
+                value=False
+            )
+
+            incremental_inference = st.checkbox(
+                "Incremental Inference (process one frame per step instead of the full sequence)",
+                value=False
+            )
+
+            record_session = st.checkbox(
+                "Record Session (store the landmarks for a later replay)",
+                value=False
+            )
+
+            use_worker_process = st.checkbox(
+                "Worker Process (analyze the webcam stream in a separate process)",
+                value=False
+            )
+
         if input_selection == "Webcam":
+            if governor.is_full():
+                st.warning("All analysis sessions are in use right now. "
+                           f"New sessions wait up to {session_queue_timeout} seconds for a free slot, "
+                           "please try again in a moment if yours is rejected.")
+            if record_session:
+                os.makedirs(recording_dir, exist_ok=True)
             rtc_configuration = RTCConfiguration({
                 "iceServers": [
                     {"urls": ["stun:stun.l.google.com:19302"]},
@@ -195,7 +328,7 @@ def render_exercise_start_page():
                 "iceTransportPolicy": "all",
             })
 
-            webrtc_streamer(
+            webrtc_ctx = webrtc_streamer(
                 key="exercise",
                 mode=WebRtcMode.SENDRECV,
                 rtc_configuration=rtc_configuration,
@@ -204,7 +337,14 @@ def render_exercise_start_page():
                                                             error_threshold=error_threshold,
                                                             visibility_threshold=visibility_threshold,
                                                             api_endpoint=api_endpoint,
-                                                            sequence_length=sequence_length
+                                                            sequence_length=sequence_length,
+                                                            prediction_stride=prediction_stride,
+                                                            adaptive_stride=adaptive_stride,
+                                                            incremental_inference=incremental_inference,
+                                                            recording_path=os.path.join(recording_dir, f"session_{uuid.uuid4().hex}.log") if record_session else None,
+                                                            governor=governor,
+                                                            queue_timeout=session_queue_timeout,
+                                                            use_worker_process=use_worker_process
                                                             ),
                 media_stream_constraints={
                     "video": {
@@ -216,23 +356,72 @@ def render_exercise_start_page():
                 },
             )
 
+            if webrtc_ctx.video_processor and webrtc_ctx.video_processor.admitted and st.button("Show Session Summary"):
+                render_session_summary(webrtc_ctx.video_processor.get_session_summary())
+
         if input_selection == "Video Upload":
             uploaded_file = st.file_uploader("Upload a video file", type=["mp4", "mov", "avi"])
             if uploaded_file:
-                if st.button("Process Video"):
-                    exercise = ExerciseAnalyzer(exercise_id=exercise_id,
-                                                draw_predicted_lm=draw_predicted_lm,
-                                                error_threshold=error_threshold,
-                                                visibility_threshold=visibility_threshold,
-                                                api_endpoint=api_endpoint,
-                                                sequence_length=sequence_length
-                                                )
-
-                    input_video_bytes = BytesIO(uploaded_file.read())
+                # Only analyze the part of the video with the set, optionally at a lower frame rate
+                col1, col2, col3 = st.columns(3)
+                start_time = col1.number_input("Start Time (s)", min_value=0.0, value=0.0, step=1.0)
+                end_time = col2.number_input("End Time (s, 0 for the end)", min_value=0.0, value=0.0, step=1.0)
+                analysis_fps_option = col3.selectbox("Analysis Frame Rate", ["Native", 30, 15, 10])
+
+                start_time = start_time or None
+                end_time = end_time or None
+                analysis_fps = None if analysis_fps_option == "Native" else analysis_fps_option
+                range_valid = end_time is None or (start_time or 0.0) < end_time
+                if not range_valid:
+                    st.error("The End Time must be after the Start Time.")
+
+                def create_analyzer():
+                    return ExerciseAnalyzer(exercise_id=exercise_id,
+                                            draw_predicted_lm=draw_predicted_lm,
+                                            error_threshold=error_threshold,
+                                            visibility_threshold=visibility_threshold,
+                                            api_endpoint=api_endpoint,
+                                            sequence_length=sequence_length,
+                                            prediction_stride=prediction_stride,
+                                            adaptive_stride=adaptive_stride,
+                                            incremental_inference=incremental_inference
+                                            )
+
+                if st.button("Estimate Processing Time", disabled=not range_valid):
+                    with st.spinner("Probing video..."):
+                        probe = probe_video(BytesIO(uploaded_file.getvalue()), create_analyzer(),
+                                            start_time=start_time, end_time=end_time, analysis_fps=analysis_fps)
+                    if probe and probe['estimated_seconds'] is None:
+                        st.error("No frames in the selected range, check the Start Time against the video length.")
+                    elif probe:
+                        st.write(f"{probe['frames_to_analyze']} of {int(probe['duration'] * probe['fps'])} frames "
+                                 f"will be analyzed at {probe['analysis_fps']:.1f} fps, "
+                                 f"estimated processing time {probe['estimated_seconds']:.0f} s.")
+                    else:
+                        st.error("Unable to read the video.")
+
+                progressive_results = st.checkbox(
+                    "Progressive Results (preview the processed video while processing)",
+                    value=True
+                )
+
+                if st.button("Process Video", disabled=not range_valid):
+                    exercise = create_analyzer()
+
+                    input_video_bytes = BytesIO(uploaded_file.getvalue())
                     input_video_bytes.seek(0)
 
-                    with st.spinner("Processing video..."):
-                        result = process_uploaded_video(input_video_bytes, exercise)
+                    if progressive_results:
+                        result = render_progressive_processing(input_video_bytes, exercise,
+                                                               start_time=start_time,
+                                                               end_time=end_time,
+                                                               analysis_fps=analysis_fps)
+                    else:
+                        with st.spinner("Processing video..."):
+                            result = process_uploaded_video(input_video_bytes, exercise,
+                                                            start_time=start_time,
+                                                            end_time=end_time,
+                                                            analysis_fps=analysis_fps)
 
                     if result["success"]:
                         st.success("Processing complete!")
@@ -242,6 +431,7 @@ def render_exercise_start_page():
                             file_name="processed_video.mp4",
                             mime="video/mp4",
                         )
+                        render_session_summary(result["session_summary"])
                     else:
                         st.error("Processing failed.")
 
@@ -11,4 +11,7 @@ setup(name='trainer',
       description="Trainer Streamlit App",
       version="0.0.1",
       install_requires=requirements,
-      packages=find_packages())
+      packages=find_packages(),
+      entry_points={
+          'console_scripts': ['trainer-batch=trainer.batch:main']
+      })
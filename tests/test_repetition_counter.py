@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from trainer.repetition_counter import RepetitionCounter, count_repetitions
+
+
+def make_trajectory(reps=8, frames_per_rep=40, noise=0.02, seed=0):
+    """
+    Build a jittered trajectory oscillating between 0.1 and -0.1, one period per repetition.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(reps * frames_per_rep)
+    values = 0.1 * np.cos(2 * np.pi * t / frames_per_rep)
+    return values + rng.normal(0.0, noise, len(values))
+
+
+def count_streaming(values, **kwargs):
+    counter = RepetitionCounter(landmark_idx=0, min_threshold=kwargs.pop('min_threshold'),
+                                max_threshold=kwargs.pop('max_threshold'), **kwargs)
+    reps = []
+    for value in values:
+        previous_count = counter.get_count()
+        counter.update_value(value)
+        if counter.get_count() != previous_count:
+            reps.append(counter.last_rep)
+    return reps
+
+
+@pytest.mark.parametrize("hysteresis, smoothing_window, min_rep_frames", [
+    (0.0, 1, 0),
+    (0.02, 1, 0),
+    (0.0, 5, 0),
+    (0.0, 1, 15),
+    (0.02, 3, 10),
+])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_count_repetitions_matches_streaming_counter(hysteresis, smoothing_window, min_rep_frames, seed):
+    values = make_trajectory(seed=seed)
+    kwargs = dict(min_threshold=0.0, max_threshold=0.0, hysteresis=hysteresis,
+                  smoothing_window=smoothing_window, min_rep_frames=min_rep_frames)
+
+    result = count_repetitions(values, **kwargs)
+    reps = count_streaming(values, **kwargs)
+
+    assert result['count'] == len(reps)
+    assert [tuple(rep) for rep in zip(result['starts'], result['ends'])] == reps
+    assert np.array_equal(result['durations'], result['ends'] - result['starts'])
+
+
+def test_hysteresis_suppresses_jitter_around_the_threshold():
+    values = make_trajectory(noise=0.03)
+    assert count_repetitions(values, 0.0, 0.0)['count'] > 8
+    assert count_repetitions(values, 0.0, 0.0, hysteresis=0.06)['count'] == 8
+
+
+def test_min_rep_frames_discards_short_repetitions():
+    values = np.array([0.1] * 5 + [-0.1] * 3 + [0.1] * 5 + [-0.1] * 10 + [0.1] * 5)
+    assert count_repetitions(values, 0.0, 0.0)['count'] == 2
+    assert count_repetitions(values, 0.0, 0.0, min_rep_frames=5)['count'] == 1
+    assert len(count_streaming(values, min_threshold=0.0, max_threshold=0.0, min_rep_frames=5)) == 1
@@ -0,0 +1,137 @@
+from collections import deque
+import numpy as np
+
+# Upper edges of the per-joint error histogram bins, errors above the last edge go to an overflow bin
+ERROR_BIN_EDGES = np.round(np.arange(0.02, 0.32, 0.02), 2)
+
+
+class SessionAnalytics:
+    """
+    A class to aggregate the feedback of a session incrementally.
+
+    Every analyzed frame updates the aggregates in O(1), and the memory does not grow with
+    the session length: only the last `max_reps` repetitions are kept in detail, all other
+    statistics are running sums and fixed-size histograms.
+
+    Tracked per session:
+    - Per-rep duration, mean score and worst joint, all over the frames from the start
+      of the 'down' phase to the end of the repetition.
+    - Per-joint error histograms and mean errors.
+    - Time under tension (frames in the 'down' phase of a repetition).
+
+    Attributes:
+        joint_ids (list): Landmark indices of the analyzed joints.
+        bin_edges (np.ndarray): Upper edges of the error histogram bins.
+        histograms (np.ndarray): Error counts of shape (joints, bins + 1).
+        reps (deque): Details of the most recent repetitions.
+    """
+    def __init__(self, joint_ids, bin_edges=ERROR_BIN_EDGES, max_reps=500):
+        """
+        Initialize the SessionAnalytics.
+
+        Args:
+            joint_ids (list): Landmark indices of the analyzed joints.
+            bin_edges (np.ndarray): Upper edges of the error histogram bins. Default is 0.02 to 0.30.
+            max_reps (int): Number of repetitions kept in detail. Default is 500.
+        """
+        self.joint_ids = list(joint_ids)
+        self.bin_edges = np.asarray(bin_edges)
+        self.reps = deque(maxlen=max_reps)
+        self.joint_range = np.arange(len(self.joint_ids))
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all aggregates to start a new session.
+        """
+        self.histograms = np.zeros((len(self.joint_ids), len(self.bin_edges) + 1), dtype=np.int64)
+        self.joint_error_sums = np.zeros(len(self.joint_ids))
+        self.frames = 0
+        self.score_sum = 0.0
+        self.tension_frames = 0
+        self.rep_count = 0
+        self.reps.clear()
+
+        # Accumulators of the repetition in progress, started at the frame the counter entered 'down'
+        self.rep_start = None
+        self.rep_frames = 0
+        self.rep_score_sum = 0.0
+        self.rep_joint_error_sums = np.zeros(len(self.joint_ids))
+
+    def update(self, errors, score, rep_counter):
+        """
+        Add the feedback of one analyzed frame.
+
+        Args:
+            errors (list): Errors for each joint, as returned by calculate_errors.
+            score (float): Performance score of the frame.
+            rep_counter (RepetitionCounter): Repetition counter after its update for this frame.
+        """
+        if len(errors) != len(self.joint_ids):
+            return
+        errors = np.asarray(errors)
+
+        self.frames += 1
+        self.score_sum += score
+        self.joint_error_sums += errors
+        self.histograms[self.joint_range, np.searchsorted(self.bin_edges, errors)] += 1
+        if rep_counter.previous_state == 'down':
+            self.tension_frames += 1
+
+        # Start a new repetition when the counter enters the 'down' phase, dropping the rest frames before it
+        if rep_counter.rep_start != self.rep_start:
+            self.rep_start = rep_counter.rep_start
+            self.rep_frames = 0
+            self.rep_score_sum = 0.0
+            self.rep_joint_error_sums[:] = 0
+
+        self.rep_frames += 1
+        self.rep_score_sum += score
+        self.rep_joint_error_sums += errors
+
+        # Close the repetition when the counter registered a new one
+        if rep_counter.get_count() > self.rep_count:
+            self.rep_count = rep_counter.get_count()
+            rep_start, rep_end = rep_counter.last_rep
+            self.reps.append({
+                'rep': self.rep_count,
+                'duration_frames': rep_end - rep_start,
+                'score': self.rep_score_sum / self.rep_frames,
+                'worst_joint': self.joint_ids[int(np.argmax(self.rep_joint_error_sums))]
+            })
+
+    def summary(self, fps=30.0):
+        """
+        Get the summary of the session so far.
+
+        Args:
+            fps (float): Frame rate used to convert frame counts to seconds. Default is 30.
+
+        Returns:
+            dict: A dictionary containing:
+                - 'frames' (int): Number of analyzed frames.
+                - 'reps' (int): Number of repetitions.
+                - 'mean_score' (float): Mean performance score over all analyzed frames.
+                - 'time_under_tension' (float): Seconds spent in the 'down' phase of repetitions.
+                - 'joint_mean_errors' (dict): Mean error per joint.
+                - 'worst_joint' (int): Joint with the highest mean error, None without analyzed frames.
+                - 'histogram_bin_edges' (list): Upper edges of the error histogram bins.
+                - 'joint_histograms' (dict): Error counts per joint, the last bin counts errors above the last edge.
+                - 'rep_details' (list): Duration in seconds, mean score and worst joint of the most recent repetitions.
+        """
+        joint_mean_errors = self.joint_error_sums / self.frames if self.frames else self.joint_error_sums
+
+        return {
+            'frames': self.frames,
+            'reps': self.rep_count,
+            'mean_score': self.score_sum / self.frames if self.frames else None,
+            'time_under_tension': self.tension_frames / fps,
+            'joint_mean_errors': {joint_id: float(error) for joint_id, error in zip(self.joint_ids, joint_mean_errors)},
+            'worst_joint': self.joint_ids[int(np.argmax(joint_mean_errors))] if self.frames else None,
+            'histogram_bin_edges': self.bin_edges.tolist(),
+            'joint_histograms': {joint_id: counts.tolist() for joint_id, counts in zip(self.joint_ids, self.histograms)},
+            'rep_details': [{'rep': rep['rep'],
+                             'duration': rep['duration_frames'] / fps,
+                             'score': rep['score'],
+                             'worst_joint': rep['worst_joint']} for rep in self.reps]
+        }
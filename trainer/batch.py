@@ -0,0 +1,254 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+from trainer.exercise_analysis import ExerciseAnalyzer
+from trainer.utils import process_uploaded_video
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi")
+MANIFEST_NAME = "manifest.jsonl"
+
+# Analyzers of the current worker process, created once per exercise and reused for every file
+_worker_analyzers = {}
+_worker_analyzer_kwargs = {}
+
+
+def init_worker(analyzer_kwargs):
+    """
+    Initialize a worker process of the batch pool.
+
+    Args:
+        analyzer_kwargs (dict): Keyword arguments for every ExerciseAnalyzer of the worker.
+    """
+    _worker_analyzer_kwargs.update(analyzer_kwargs)
+
+
+def get_worker_analyzer(exercise_id):
+    """
+    Get the analyzer of the current worker for an exercise, loading its model only on first use.
+
+    Args:
+        exercise_id (int): ID of the exercise.
+
+    Returns:
+        ExerciseAnalyzer: Analyzer reset for a new video.
+    """
+    analyzer = _worker_analyzers.get(exercise_id)
+    if analyzer is None:
+        analyzer = ExerciseAnalyzer(exercise_id=exercise_id, **_worker_analyzer_kwargs)
+        _worker_analyzers[exercise_id] = analyzer
+    else:
+        analyzer.reset()
+    return analyzer
+
+
+def process_file(input_path, output_path, exercise_id):
+    """
+    Analyze a single video file inside a worker process.
+
+    The processed video is written to a temporary file first and renamed once complete,
+    so an interrupted run never leaves a truncated output behind.
+
+    Args:
+        input_path (str): Path of the input video.
+        output_path (str): Path of the processed video.
+        exercise_id (int): ID of the exercise.
+
+    Returns:
+        dict: Manifest record of the file.
+    """
+    start_time = time.perf_counter()
+    record = {"input": os.path.basename(input_path),
+              "output": os.path.basename(output_path),
+              "exercise_id": exercise_id,
+              "success": False,
+              "frames_processed": 0,
+              "reps": None}
+    try:
+        analyzer = get_worker_analyzer(exercise_id)
+        with open(input_path, "rb") as f:
+            input_video_bytes = BytesIO(f.read())
+
+        result = process_uploaded_video(input_video_bytes, analyzer)
+        if result["success"]:
+            temp_output_path = f"{output_path}.part"
+            with open(temp_output_path, "wb") as f:
+                f.write(result["processed_video_bytes"].getbuffer())
+            os.replace(temp_output_path, output_path)
+
+            record["success"] = True
+            record["frames_processed"] = result["frames_processed"]
+            if analyzer.exercise_data is not None:
+                record["exercise_id"] = analyzer.exercise_id
+                record["reps"] = analyzer.rep_counter.get_count()
+                record["session_summary"] = result["session_summary"]
+    except Exception as e:
+        print(f"Error processing {input_path}: {e}")
+        record["error"] = str(e)
+
+    record["seconds"] = round(time.perf_counter() - start_time, 3)
+    record["fps"] = round(record["frames_processed"] / record["seconds"], 2) if record["seconds"] else 0.0
+    return record
+
+
+def find_videos(input_dir):
+    """
+    List the video files of a directory.
+
+    Args:
+        input_dir (str): Directory to search.
+
+    Returns:
+        list: Sorted paths of all video files.
+    """
+    return sorted(os.path.join(input_dir, name) for name in os.listdir(input_dir)
+                  if name.lower().endswith(VIDEO_EXTENSIONS))
+
+
+def load_manifest(output_dir):
+    """
+    Read the manifest of a previous run.
+
+    Args:
+        output_dir (str): Output directory of the run.
+
+    Returns:
+        dict: The latest manifest record for every input file name.
+    """
+    manifest = {}
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return manifest
+
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be incomplete if the run was interrupted
+                continue
+            manifest[record["input"]] = record
+    return manifest
+
+
+def run_batch(input_dir, output_dir, exercise_id, workers=None, analyzer_kwargs=None, resume=True):
+    """
+    Analyze all videos of a directory with a process pool.
+
+    Every completed file is appended to the manifest in the output directory. With
+    `resume`, files that were already processed successfully are skipped.
+
+    Args:
+        input_dir (str): Directory with the input videos.
+        output_dir (str): Directory for the processed videos and the manifest.
+        exercise_id (int): ID of the exercise, or recognition_params['ExerciseID'] to recognize it.
+        workers (int): Number of worker processes. Default is the number of CPUs.
+        analyzer_kwargs (dict): Keyword arguments for the ExerciseAnalyzer of every worker.
+        resume (bool): Whether to skip files completed by a previous run.
+
+    Returns:
+        dict: Summary of the run with the number of files, frames and the throughput.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir) if resume else {}
+
+    jobs = []
+    for input_path in find_videos(input_dir):
+        name = os.path.basename(input_path)
+        output_path = os.path.join(output_dir, f"{os.path.splitext(name)[0]}_processed.mp4")
+        record = manifest.get(name)
+        if record and record["success"] and os.path.exists(output_path):
+            continue
+        jobs.append((input_path, output_path))
+
+    print(f"{len(jobs)} files to process, {len(manifest)} in manifest")
+
+    summary = {"files": 0, "failed": 0, "frames": 0, "seconds": 0.0}
+    start_time = time.perf_counter()
+
+    # Spawn the workers, forking a process with an initialized TensorFlow runtime is unsafe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=context,
+                             initializer=init_worker,
+                             initargs=(analyzer_kwargs or {},)) as executor, \
+            open(os.path.join(output_dir, MANIFEST_NAME), "a") as manifest_file:
+        futures = {executor.submit(process_file, input_path, output_path, exercise_id): (input_path, output_path)
+                   for input_path, output_path in jobs}
+
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                # A worker killed by the OS breaks the pool, the affected files are recorded as failed
+                input_path, output_path = futures[future]
+                print(f"Error processing {input_path}: worker failed: {e!r}")
+                record = {"input": os.path.basename(input_path),
+                          "output": os.path.basename(output_path),
+                          "exercise_id": exercise_id,
+                          "success": False,
+                          "frames_processed": 0,
+                          "reps": None,
+                          "error": f"worker failed: {e!r}",
+                          "seconds": 0.0,
+                          "fps": 0.0}
+            manifest_file.write(json.dumps(record) + "\n")
+            manifest_file.flush()
+
+            summary["files"] += 1
+            summary["failed"] += 0 if record["success"] else 1
+            summary["frames"] += record["frames_processed"]
+            status = "done" if record["success"] else "FAILED"
+            print(f"[{summary['files']}/{len(jobs)}] {record['input']}: {status}, "
+                  f"{record['frames_processed']} frames in {record['seconds']}s ({record['fps']} fps)")
+
+    summary["seconds"] = round(time.perf_counter() - start_time, 3)
+    summary["fps"] = round(summary["frames"] / summary["seconds"], 2) if summary["seconds"] else 0.0
+    summary["seconds_per_file"] = round(summary["seconds"] / summary["files"], 3) if summary["files"] else 0.0
+    return summary
+
+
+def main(argv=None):
+    """
+    Command-line entry point to analyze a directory of videos.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Analyze a directory of exercise videos.")
+    parser.add_argument("input_dir", help="Directory with the input videos")
+    parser.add_argument("output_dir", help="Directory for the processed videos and the manifest")
+    parser.add_argument("--exercise-id", type=int, default=1, help="Exercise ID, 0 to recognize the exercise")
+    parser.add_argument("--api-endpoint", required=True, help="Model download endpoint")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--sequence-length", type=int, default=10)
+    parser.add_argument("--error-threshold", type=float, default=0.1)
+    parser.add_argument("--visibility-threshold", type=float, default=0.5)
+    parser.add_argument("--prediction-stride", type=int, default=1, help="Run the sequence model every k-th frame")
+    parser.add_argument("--incremental-inference", action="store_true", help="Run recurrent models one timestep per frame")
+    parser.add_argument("--no-predicted-landmarks", action="store_true", help="Do not draw the predicted landmarks")
+    parser.add_argument("--no-resume", action="store_true", help="Process all files again")
+    args = parser.parse_args(argv)
+
+    analyzer_kwargs = {"api_endpoint": args.api_endpoint,
+                       "sequence_length": args.sequence_length,
+                       "error_threshold": args.error_threshold,
+                       "visibility_threshold": args.visibility_threshold,
+                       "prediction_stride": args.prediction_stride,
+                       "incremental_inference": args.incremental_inference,
+                       "draw_predicted_lm": not args.no_predicted_landmarks}
+
+    summary = run_batch(args.input_dir, args.output_dir, args.exercise_id,
+                        workers=args.workers,
+                        analyzer_kwargs=analyzer_kwargs,
+                        resume=not args.no_resume)
+
+    print(f"Processed {summary['files']} files ({summary['failed']} failed), {summary['frames']} frames "
+          f"in {summary['seconds']}s: {summary['fps']} fps, {summary['seconds_per_file']}s per file")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from trainer.exercise_analysis import ExerciseAnalyzer
+from trainer.params import exercise_list
+
+NUM_LANDMARKS = 33
+FRAME_DTYPE = np.dtype('<f4')
+FRAME_SIZE = NUM_LANDMARKS * 4 * FRAME_DTYPE.itemsize
+INDEX_NAME = "index.jsonl"
+
+# Frames per chunk file, about 138 MB, a session never spans two chunks
+CHUNK_FRAMES = 262144
+
+# Models of the current scoring worker, loaded once per exercise
+_worker_models = {}
+_worker_model_sources = {}
+
+
+def get_chunk_path(corpus_path, chunk):
+    """
+    Get the path of a chunk file of a corpus.
+
+    Args:
+        corpus_path (str): Directory of the corpus.
+        chunk (int): Number of the chunk.
+
+    Returns:
+        str: Path of the chunk file.
+    """
+    return os.path.join(corpus_path, f"chunk_{chunk:05d}.f32")
+
+
+def read_session_landmarks(corpus_path, session):
+    """
+    Get the landmarks of a session as a read-only memory map, without opening the index.
+
+    Args:
+        corpus_path (str): Directory of the corpus.
+        session (dict): Index record of the session.
+
+    Returns:
+        np.ndarray: World landmarks of shape (frames, 33, 4).
+    """
+    if not session['frames']:
+        return np.zeros((0, NUM_LANDMARKS, 4), dtype=FRAME_DTYPE)
+    return np.memmap(get_chunk_path(corpus_path, session['chunk']), dtype=FRAME_DTYPE, mode='r',
+                     offset=session['offset'] * FRAME_SIZE, shape=(session['frames'], NUM_LANDMARKS, 4))
+
+
+class LandmarkCorpus:
+    """
+    A class to store the landmarks of many sessions for offline re-scoring.
+
+    The world landmarks of every session are stored as a float32 array of shape
+    (frames, 33, 4), the layout of the analyzer, appended to chunk files without any
+    framing. An index of JSON lines records the chunk, offset, length and exercise ID of
+    every session. Sessions are read back through memory maps, and score_landmarks reads
+    and scores them one batch of windows at a time, so scoring never loads a whole session.
+
+    Appends are crash-safe: the landmarks are written and flushed before the index line,
+    and landmarks without an index line, left by an interrupted append, are truncated
+    before the next append.
+
+    Attributes:
+        path (str): Directory of the corpus.
+        chunk_frames (int): Maximum number of frames per chunk file.
+        sessions (list): Index records of all sessions.
+    """
+    def __init__(self, path, chunk_frames=CHUNK_FRAMES):
+        """
+        Open a corpus, creating the directory if it does not exist.
+
+        Args:
+            path (str): Directory of the corpus.
+            chunk_frames (int): Maximum number of frames per chunk file. Default is CHUNK_FRAMES.
+        """
+        self.path = path
+        self.chunk_frames = chunk_frames
+        os.makedirs(path, exist_ok=True)
+
+        self.sessions = []
+        index_path = os.path.join(path, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    try:
+                        self.sessions.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # The last line may be incomplete if an append was interrupted
+                        continue
+        self.repaired = False
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def get_chunk_path(self, chunk):
+        return get_chunk_path(self.path, chunk)
+
+    def get_chunk_end(self, chunk):
+        """
+        Get the number of indexed frames in a chunk.
+
+        Args:
+            chunk (int): Number of the chunk.
+
+        Returns:
+            int: End of the last indexed session in the chunk in frames.
+        """
+        return max((session['offset'] + session['frames'] for session in self.sessions if session['chunk'] == chunk), default=0)
+
+    def repair(self):
+        """
+        Remove the leftovers of an interrupted append: unindexed landmarks at the end of the
+        last chunk or in a new chunk, and an incomplete last line of the index.
+        """
+        chunk = self.sessions[-1]['chunk'] if self.sessions else 0
+        for chunk, end in ((chunk, self.get_chunk_end(chunk)), (chunk + 1, 0)):
+            chunk_path = self.get_chunk_path(chunk)
+            if os.path.exists(chunk_path) and os.path.getsize(chunk_path) > end * FRAME_SIZE:
+                os.truncate(chunk_path, end * FRAME_SIZE)
+
+        index_path = os.path.join(self.path, INDEX_NAME)
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                index = f.read()
+            if index and not index.endswith(b"\n"):
+                os.truncate(index_path, index.rfind(b"\n") + 1)
+
+    def append(self, landmarks, exercise_id, session_id=None, source=None):
+        """
+        Append the landmarks of a session.
+
+        Args:
+            landmarks (np.ndarray): World landmarks of shape (frames, 33, 4).
+            exercise_id (int): ID of the exercise of the session.
+            session_id (str): ID of the session. Default is a new random ID.
+            source (str): Origin of the landmarks, e.g. the path of a session log. Default is None.
+
+        Returns:
+            dict: Index record of the session.
+        """
+        landmarks = np.ascontiguousarray(landmarks, dtype=FRAME_DTYPE)
+        if landmarks.ndim != 3 or landmarks.shape[1:] != (NUM_LANDMARKS, 4):
+            raise ValueError(f"Expected landmarks of shape (frames, {NUM_LANDMARKS}, 4), got {landmarks.shape}")
+
+        if not self.repaired:
+            self.repair()
+            self.repaired = True
+
+        # Start a new chunk when the session does not fit into the current one
+        chunk = self.sessions[-1]['chunk'] if self.sessions else 0
+        offset = self.get_chunk_end(chunk)
+        if offset and offset + len(landmarks) > self.chunk_frames:
+            chunk, offset = chunk + 1, 0
+
+        with open(self.get_chunk_path(chunk), "ab") as f:
+            f.write(landmarks.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        session = {"session_id": session_id or uuid.uuid4().hex,
+                   "exercise_id": int(exercise_id),
+                   "chunk": chunk,
+                   "offset": offset,
+                   "frames": len(landmarks),
+                   "source": source}
+        with open(os.path.join(self.path, INDEX_NAME), "a") as f:
+            f.write(json.dumps(session) + "\n")
+        self.sessions.append(session)
+        return session
+
+    def import_session_log(self, log_path):
+        """
+        Append the world landmarks of a recorded session log.
+
+        Args:
+            log_path (str): Path of the session log.
+
+        Returns:
+            dict: Index record of the session, None if the log has no frames.
+        """
+        from trainer.recording import SessionLog
+
+        session_log = SessionLog(log_path)
+        if not len(session_log):
+            return None
+        return self.append(session_log.world_landmarks, session_log.exercise_id, source=os.path.abspath(log_path))
+
+    def get_landmarks(self, session):
+        """
+        Get the landmarks of a session as a read-only memory map.
+
+        Args:
+            session (dict): Index record of the session.
+
+        Returns:
+            np.ndarray: World landmarks of shape (frames, 33, 4).
+        """
+        return read_session_landmarks(self.path, session)
+
+    def select(self, exercise_ids=None):
+        """
+        Get the sessions of some exercises.
+
+        Args:
+            exercise_ids (list): IDs of the exercises. Default is None (all sessions).
+
+        Returns:
+            list: Index records of the matching sessions.
+        """
+        if exercise_ids is None:
+            return list(self.sessions)
+        return [session for session in self.sessions if session['exercise_id'] in exercise_ids]
+
+
+def sliding_windows(frame_data, sequence_length):
+    """
+    Get all windows of consecutive frames without copying.
+
+    Args:
+        frame_data (np.ndarray): Frame features of shape (frames, features).
+        sequence_length (int): Number of frames per window.
+
+    Returns:
+        np.ndarray: Read-only view of shape (frames - sequence_length + 1, sequence_length, features).
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(frame_data, sequence_length, axis=0)
+    return np.moveaxis(windows, -1, 1)
+
+
+def score_landmarks(landmarks, model, landmark_idx, sequence_length=10, visibility_threshold=0.5,
+                    error_threshold=0.1, batch_size=256):
+    """
+    Score the landmarks of a session with a sequence model, like the analyzer does frame by frame.
+
+    As in the analyzer, only frames with all landmarks of the exercise visible enter the
+    sequence, the window ending at a frame is used to predict it, and its errors are the
+    distances between the actual and the predicted coordinates.
+
+    Args:
+        landmarks (np.ndarray): World landmarks of shape (frames, 33, 4).
+        model (keras.Model): Sequence model of the exercise.
+        landmark_idx (list): Indices of the landmarks of the exercise.
+        sequence_length (int): Number of frames per window. Default is 10.
+        visibility_threshold (float): Minimum visibility of a landmark. Default is 0.5.
+        error_threshold (float): Threshold for significant errors. Default is 0.1.
+        batch_size (int): Number of windows read and scored per model call. Default is 256.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'windows' (int): Number of scored windows.
+            - 'mean_score' (float): Mean performance score, None without windows.
+            - 'joint_mean_errors' (dict): Mean error per joint.
+            - 'error_rate' (float): Share of joint errors above the error threshold.
+    """
+    visible_idx = np.flatnonzero(np.all(landmarks[:, landmark_idx, 3] >= visibility_threshold, axis=1))
+    num_windows = len(visible_idx) - sequence_length + 1
+    if num_windows <= 0:
+        return {'windows': 0, 'mean_score': None, 'joint_mean_errors': {}, 'error_rate': None}
+
+    score_sum = 0.0
+    joint_error_sums = np.zeros(len(landmark_idx))
+    significant_errors = 0
+
+    # Read and score one batch of windows at a time, so memory does not grow with the session length
+    for batch_start in range(0, num_windows, batch_size):
+        batch_end = min(batch_start + batch_size, num_windows)
+        frames = np.asarray(landmarks[visible_idx[batch_start:batch_end + sequence_length - 1]])
+        frame_data = frames[:, landmark_idx, :3].reshape(len(frames), -1)
+        windows = np.ascontiguousarray(sliding_windows(frame_data, sequence_length))
+        predicted_frames = np.asarray(model.predict_on_batch(windows))
+
+        errors = ExerciseAnalyzer.calculate_errors_batch(frames[sequence_length - 1:], predicted_frames, landmark_idx)
+        score_sum += float(ExerciseAnalyzer.calculate_performance_scores(errors).sum())
+        joint_error_sums += errors.sum(axis=0)
+        significant_errors += int(np.count_nonzero(errors > error_threshold))
+
+    joint_mean_errors = joint_error_sums / num_windows
+    return {'windows': num_windows,
+            'mean_score': score_sum / num_windows,
+            'joint_mean_errors': {joint_id: float(error) for joint_id, error in zip(landmark_idx, joint_mean_errors)},
+            'error_rate': significant_errors / (num_windows * len(landmark_idx))}
+
+
+def init_scoring_worker(model_sources):
+    """
+    Initialize a worker process of the scoring pool.
+
+    Args:
+        model_sources (dict): Model file path or download endpoint by exercise ID.
+    """
+    _worker_model_sources.update(model_sources)
+
+
+def get_worker_model(exercise_id):
+    """
+    Get the model of an exercise in the current worker, loading it on first use.
+
+    Args:
+        exercise_id (int): ID of the exercise.
+
+    Returns:
+        keras.Model: The model, None if it could not be loaded.
+    """
+    if exercise_id not in _worker_models:
+        source = _worker_model_sources[exercise_id]
+        if source.startswith(("http://", "https://")):
+            save_path = f"/tmp/model_{exercise_id}_{uuid.uuid4().hex}.keras"
+            model_file_path = ExerciseAnalyzer.fetch_model_file(source, exercise_id, save_path)
+            model = ExerciseAnalyzer.load_downloaded_model(model_file_path) if model_file_path else None
+        else:
+            from tensorflow.keras.models import load_model
+            model = load_model(source)
+        _worker_models[exercise_id] = model
+    return _worker_models[exercise_id]
+
+
+def score_session(corpus_path, session, scoring_kwargs):
+    """
+    Score a single session of a corpus inside a worker process.
+
+    Args:
+        corpus_path (str): Directory of the corpus.
+        session (dict): Index record of the session.
+        scoring_kwargs (dict): Keyword arguments of score_landmarks.
+
+    Returns:
+        dict: The scores of score_landmarks with the session ID, exercise ID and the time taken.
+    """
+    start_time = time.perf_counter()
+    record = {'session_id': session['session_id'], 'exercise_id': session['exercise_id'], 'windows': 0}
+    try:
+        model = get_worker_model(session['exercise_id'])
+        if model is None:
+            raise ValueError(f"No model for exercise {session['exercise_id']}")
+        landmarks = read_session_landmarks(corpus_path, session)
+        record.update(score_landmarks(landmarks, model, exercise_list[session['exercise_id']]['Landmarks'], **scoring_kwargs))
+    except Exception as e:
+        print(f"Error scoring session {session['session_id']}: {e}")
+        record['error'] = str(e)
+    record['seconds'] = round(time.perf_counter() - start_time, 3)
+    return record
+
+
+def score_corpus(corpus_path, model_sources, exercise_ids=None, workers=None, output_path=None, scoring_kwargs=None):
+    """
+    Score the sessions of a corpus with a process pool.
+
+    Args:
+        corpus_path (str): Directory of the corpus.
+        model_sources (dict): Model file path or download endpoint by exercise ID.
+        exercise_ids (list): Only score sessions of these exercises. Default is all exercises with a model.
+        workers (int): Number of worker processes. Default is the number of CPUs.
+        output_path (str): JSON lines file to write the scores of every session to. Default is None.
+        scoring_kwargs (dict): Keyword arguments of score_landmarks.
+
+    Returns:
+        dict: Summary of the run with the number of sessions, windows and the throughput in windows per second.
+    """
+    corpus = LandmarkCorpus(corpus_path)
+    exercise_ids = list(model_sources) if exercise_ids is None else exercise_ids
+    sessions = corpus.select([exercise_id for exercise_id in exercise_ids if exercise_id in model_sources])
+    print(f"{len(sessions)} of {len(corpus)} sessions to score")
+    unknown = sum(1 for session in corpus.sessions if session['exercise_id'] not in exercise_list)
+    if unknown:
+        print(f"Skipping {unknown} sessions without a recognized exercise")
+
+    summary = {"sessions": 0, "failed": 0, "windows": 0, "seconds": 0.0}
+    start_time = time.perf_counter()
+
+    # Spawn the workers, forking a process with an initialized TensorFlow runtime is unsafe
+    context = multiprocessing.get_context("spawn")
+    output_file = open(output_path, "w") if output_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=context,
+                                 initializer=init_scoring_worker,
+                                 initargs=(model_sources,)) as executor:
+            futures = {executor.submit(score_session, corpus_path, session, scoring_kwargs or {}): session
+                       for session in sessions}
+
+            for future in as_completed(futures):
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # A worker killed by the OS breaks the pool, the affected sessions are recorded as failed
+                    session = futures[future]
+                    print(f"Error scoring session {session['session_id']}: worker failed: {e!r}")
+                    record = {'session_id': session['session_id'],
+                              'exercise_id': session['exercise_id'],
+                              'windows': 0,
+                              'error': f"worker failed: {e!r}",
+                              'seconds': 0.0}
+                if output_file is not None:
+                    output_file.write(json.dumps(record) + "\n")
+                    output_file.flush()
+
+                summary["sessions"] += 1
+                summary["failed"] += 1 if "error" in record else 0
+                summary["windows"] += record["windows"]
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    summary["seconds"] = round(time.perf_counter() - start_time, 3)
+    summary["windows_per_second"] = round(summary["windows"] / summary["seconds"], 1) if summary["seconds"] else 0.0
+    return summary
+
+
+def main(argv=None):
+    """
+    Command-line entry point to import session logs into a corpus and to score a corpus.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Store session landmarks in a corpus and re-score them offline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Append recorded session logs to a corpus")
+    import_parser.add_argument("corpus", help="Directory of the corpus")
+    import_parser.add_argument("logs", nargs="+", help="Paths of the session logs")
+
+    score_parser = subparsers.add_parser("score", help="Score all sessions of a corpus")
+    score_parser.add_argument("corpus", help="Directory of the corpus")
+    score_parser.add_argument("--api-endpoint", default=None, help="Model download endpoint for all exercises")
+    score_parser.add_argument("--model", action="append", default=[], metavar="EXERCISE_ID=PATH",
+                              help="Local model file of an exercise, overrides the endpoint")
+    score_parser.add_argument("--exercise-id", type=int, nargs="+", default=None, help="Only score these exercises")
+    score_parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    score_parser.add_argument("--output", default=None, help="JSON lines file for the scores of every session")
+    score_parser.add_argument("--sequence-length", type=int, default=10)
+    score_parser.add_argument("--visibility-threshold", type=float, default=0.5)
+    score_parser.add_argument("--error-threshold", type=float, default=0.1)
+    score_parser.add_argument("--batch-size", type=int, default=256, help="Windows per model call")
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        corpus = LandmarkCorpus(args.corpus)
+        for log_path in args.logs:
+            session = corpus.import_session_log(log_path)
+            if session:
+                print(f"Imported {log_path}: {session['frames']} frames of exercise {session['exercise_id']}")
+            else:
+                print(f"Skipped {log_path}: no frames")
+        return
+
+    model_sources = {exercise_id: args.api_endpoint for exercise_id in exercise_list} if args.api_endpoint else {}
+    for model in args.model:
+        exercise_id, path = model.split("=", 1)
+        model_sources[int(exercise_id)] = path
+
+    summary = score_corpus(args.corpus, model_sources,
+                           exercise_ids=args.exercise_id,
+                           workers=args.workers,
+                           output_path=args.output,
+                           scoring_kwargs={"sequence_length": args.sequence_length,
+                                           "visibility_threshold": args.visibility_threshold,
+                                           "error_threshold": args.error_threshold,
+                                           "batch_size": args.batch_size})
+
+    print(f"Scored {summary['sessions']} sessions ({summary['failed']} failed), {summary['windows']} windows "
+          f"in {summary['seconds']}s: {summary['windows_per_second']} windows/s")
+
+
+if __name__ == "__main__":
+    main()
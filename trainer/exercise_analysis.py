@@ -1,13 +1,32 @@
 import math
 import requests
 import os
+import time
+import uuid
+from contextlib import nullcontext
 import cv2
 import mediapipe as mp
 import numpy as np
 from mediapipe.framework.formats.landmark_pb2 import Landmark, LandmarkList
 from tensorflow.keras.models import load_model
 from trainer.repetition_counter import RepetitionCounter
-from trainer.params import exercise_list, fixed_landmark_idx
+from trainer.analytics import SessionAnalytics
+from trainer.hud import HudLayer
+from trainer.model_cache import model_cache
+from trainer.exercise_recognition import ExerciseRecognizer
+from trainer.prediction import SequencePredictor
+from trainer.recording import SessionRecorder
+from trainer.params import exercise_list, fixed_landmark_idx, recognition_params
+from trainer.utils import landmarks_to_array
+
+# Maximum time to wait for a model that is being loaded by another session or the prefetcher
+MODEL_WAIT_TIMEOUT = 300
+
+# Number of frames between two checks of the degradation level of the resource governor
+DEGRADATION_CHECK_INTERVAL = 30
+
+# Prediction stride used at the highest degradation level
+DEGRADED_PREDICTION_STRIDE = 3
 
 
 class ExerciseAnalyzer:
@@ -19,6 +38,7 @@ class ExerciseAnalyzer:
     - Calculating errors between actual and predicted poses.
     - Displaying visual feedback for exercise form correction.
     - Managing exercise-specific data such as landmarks and models.
+    - Recognizing the exercise automatically when started with the recognition exercise ID.
 
     Attributes:
         sequence_length (int): Number of frames to analyze for prediction.
@@ -31,9 +51,16 @@ class ExerciseAnalyzer:
         landmark_idx (list): Indices of landmarks used in the current exercise.
         connections_idx (list): Connections between landmarks for drawing.
         model (object): Loaded predictive model for the exercise.
+        predictor (SequencePredictor): Runs the model on the sequence buffer with the configured stride.
+        analytics (SessionAnalytics): Per-rep and per-joint aggregates of the session.
+        hud (HudLayer): Cached heads-up display, rebuilt when the frame size or the exercise changes.
         index_mapping (dict): Mapping from original to reindexed landmark indices.
         mp_pose (object): MediaPipe Pose solution.
         pose (object): Initialized MediaPipe Pose model.
+        recognizer (ExerciseRecognizer): Exercise recognizer, only set if the exercise has to be recognized.
+        recorder (SessionRecorder): Records the pose results of every frame, None if not recording.
+        governor (ResourceGovernor): Shares the CPU with other sessions of the process, None if not governed.
+        degradation_level (int): Degradation level currently applied, see DEGRADATION_STEPS in governor.
     """
     def __init__(self,
                  exercise_id=1,
@@ -41,16 +68,35 @@ class ExerciseAnalyzer:
                  error_threshold=0.1,
                  draw_predicted_lm=True,
                  visibility_threshold=0.5,
-                 api_endpoint=None):
+                 api_endpoint=None,
+                 prediction_stride=1,
+                 adaptive_stride=False,
+                 max_prediction_stride=5,
+                 incremental_inference=False,
+                 recording_path=None,
+                 hud_layout=None,
+                 pose_complexity=1,
+                 governor=None):
         """
         Initialize the ExerciseAnalyzer class with exercise-specific parameters.
 
         Args:
             exercise_id (int): ID of the exercise to load. Default is 1.
+                Use recognition_params['ExerciseID'] to recognize the exercise automatically.
             sequence_length (int): Number of frames for sequence-based prediction. Default is 10.
             error_threshold (float): Threshold for identifying significant errors. Default is 0.1.
             draw_predicted_lm (bool): Whether to draw predicted landmarks on frames. Default is True.
             visibility_threshold (float): Minimum visibility score for a landmark to be considered visible. Default is 0.5.
+            prediction_stride (int): Run the sequence model every k-th frame and extrapolate in between. Default is 1.
+            adaptive_stride (bool): Whether to fall back to stride 1 while the error is high. Default is False.
+            max_prediction_stride (int): Largest stride used by the adaptive stride. Default is 5.
+            incremental_inference (bool): Whether to run recurrent models one timestep per frame
+                instead of re-running the full window. Default is False.
+            recording_path (str): Path of a session log to append the pose results of every frame to. Default is None.
+            hud_layout (dict): Values overriding the default `hud_layout` of the heads-up display. Default is None.
+            pose_complexity (int): Model complexity of MediaPipe Pose (0, 1 or 2). Default is 1.
+            governor (ResourceGovernor): Limits the concurrent predictions and degrades the analysis
+                when the process is saturated. Default is None.
         """
         self.exercise_id = exercise_id
         self.sequence_length = sequence_length
@@ -60,6 +106,99 @@ class ExerciseAnalyzer:
         self.current_sequence = []
         self.error_indices = []
         self.api_endpoint = api_endpoint
+        self.prediction_stride = prediction_stride
+        self.adaptive_stride = adaptive_stride
+        self.max_prediction_stride = max_prediction_stride
+        self.incremental_inference = incremental_inference
+        self.exercise_data = None
+        self.recognizer = None
+        self.hud_layout = hud_layout
+        self.hud = None
+        self.recorder = SessionRecorder(recording_path, exercise_id=exercise_id) if recording_path else None
+        self.base_draw_predicted_lm = draw_predicted_lm
+        self.pose_complexity = pose_complexity
+        self.governor = governor
+        self.degradation_level = 0
+        self.frames_processed = 0
+        self.frame_step = 1
+
+        # Load exercise-specific data, or the classifier if the exercise has to be recognized first
+        if exercise_id == recognition_params['ExerciseID']:
+            self.recognizer = ExerciseRecognizer(model=self.load_recognition_model())
+        else:
+            self.load_exercise(exercise_id)
+
+        # Initialize Mediapipe Pose solution
+        self.mp_pose = mp.solutions.pose
+        self.pose = self.create_pose(pose_complexity)
+
+    def create_pose(self, model_complexity):
+        """
+        Create the MediaPipe Pose model.
+
+        Args:
+            model_complexity (int): Model complexity of MediaPipe Pose (0, 1 or 2).
+
+        Returns:
+            object: Initialized MediaPipe Pose model.
+        """
+        return self.mp_pose.Pose(static_image_mode=False,
+                                 model_complexity=model_complexity,
+                                 smooth_landmarks=True,
+                                 enable_segmentation=False,
+                                 min_detection_confidence=0.5,
+                                 min_tracking_confidence=0.5)
+
+    def apply_degradation(self, level):
+        """
+        Apply a degradation level of the resource governor, see DEGRADATION_STEPS in governor.
+
+        Every level includes the steps of the lower levels:
+        1. Do not draw the predicted landmarks.
+        2. Run MediaPipe Pose with model complexity 0.
+        3. Run the sequence model only every DEGRADED_PREDICTION_STRIDE frames.
+
+        Level 0 restores the configured settings.
+
+        Args:
+            level (int): The degradation level.
+        """
+        if level == self.degradation_level:
+            return
+
+        self.draw_predicted_lm = self.base_draw_predicted_lm and level < 1
+
+        current_complexity = 0 if self.degradation_level >= 2 else self.pose_complexity
+        pose_complexity = 0 if level >= 2 else self.pose_complexity
+        if pose_complexity != current_complexity:
+            self.pose.close()
+            self.pose = self.create_pose(pose_complexity)
+
+        print(f"Degradation level {self.degradation_level} -> {level}")
+        self.degradation_level = level
+        if self.exercise_data is not None:
+            self.apply_prediction_stride()
+
+    def apply_prediction_stride(self):
+        """
+        Apply the prediction stride of the degradation level, the adaptive stride does not go below it.
+        """
+        min_stride = DEGRADED_PREDICTION_STRIDE if self.degradation_level >= 3 else 1
+        self.predictor.min_prediction_stride = min_stride
+        self.predictor.prediction_stride = max(self.prediction_stride, min_stride)
+
+    def load_exercise(self, exercise_id):
+        """
+        Load the data, model and repetition counter of an exercise and reset the sequence buffer.
+
+        Args:
+            exercise_id (int): ID of the exercise to load.
+        """
+        self.exercise_id = exercise_id
+        self.current_sequence = []
+        self.error_indices = []
+        if self.recorder is not None:
+            self.recorder.set_exercise_id(exercise_id)
 
         # Load exercise-specific data
         self.exercise_data = self.get_exercise_data()
@@ -67,22 +206,145 @@ class ExerciseAnalyzer:
         self.connections_idx = self.exercise_data['Connections']
         self.model = self.exercise_data['Model']
         self.index_mapping = self.exercise_data['IndexMapping']
-
-        # Initialize Mediapipe Pose solution
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(static_image_mode=False,
-                                      model_complexity=1,
-                                      smooth_landmarks=True,
-                                      enable_segmentation=False,
-                                      min_detection_confidence=0.5,
-                                      min_tracking_confidence=0.5)
+        self.predictor = SequencePredictor(self.model,
+                                           prediction_stride=self.prediction_stride,
+                                           adaptive_stride=self.adaptive_stride,
+                                           max_prediction_stride=self.max_prediction_stride,
+                                           error_threshold=self.error_threshold,
+                                           incremental=self.incremental_inference)
+        self.apply_prediction_stride()
 
         # Create Repition Counter (initialize once outside if used repeatedly)
         self.rep_counter = RepetitionCounter(
             landmark_idx=self.exercise_data['Rep_Landmark_ID'],
             min_threshold=self.exercise_data['Min_Threshold'],
             max_threshold=self.exercise_data['Max_Threshold'],
-            direction_axis=self.exercise_data['Rep_Axis'],)
+            direction_axis=self.exercise_data['Rep_Axis'],
+            hysteresis=self.exercise_data.get('Hysteresis', 0.0),
+            smoothing_window=self.exercise_data.get('Smoothing_Window', 1),
+            min_rep_frames=self.exercise_data.get('Min_Rep_Frames', 0))
+        if self.frame_step > 1:
+            self.set_frame_step(self.frame_step)
+
+        # Aggregate the feedback of the session
+        self.analytics = SessionAnalytics(joint_ids=self.landmark_idx)
+
+        # The HUD shows the exercise name, build it again on the next frame
+        self.hud = None
+
+    def reset(self):
+        """
+        Reset the session state so the analyzer can be reused for a new video.
+
+        Clears the sequence buffer, the repetition counter and the pose tracking. An analyzer
+        created for exercise recognition starts recognizing again.
+        """
+        self.current_sequence = []
+        self.error_indices = []
+        self.pose.reset()
+
+        if self.recognizer is not None:
+            self.recognizer.reset()
+            self.exercise_data = None
+        elif self.exercise_data is not None:
+            self.predictor.reset()
+            self.rep_counter.reset()
+            self.analytics.reset()
+
+    def set_sequence_length(self, sequence_length):
+        """
+        Change the number of frames of the prediction window.
+
+        Clears the sequence buffer and the state of the predictor, which depends on the window.
+
+        Args:
+            sequence_length (int): Number of frames for sequence-based prediction.
+        """
+        self.sequence_length = sequence_length
+        self.current_sequence = []
+        if self.exercise_data is not None:
+            self.predictor.reset()
+
+    def set_frame_step(self, frame_step):
+        """
+        Adapt the frame-based settings of the repetition counter to analyzing only every n-th frame.
+
+        The smoothing window and the minimum repetition duration of the exercise are divided
+        by the frame step, so they cover the same time as at the native frame rate.
+
+        Args:
+            frame_step (int): Number of video frames per analyzed frame, 1 for the native frame rate.
+        """
+        self.frame_step = frame_step
+        if self.exercise_data is not None:
+            self.rep_counter.set_filter(
+                smoothing_window=max(1, round(self.exercise_data.get('Smoothing_Window', 1) / frame_step)),
+                min_rep_frames=round(self.exercise_data.get('Min_Rep_Frames', 0) / frame_step))
+
+    def close(self):
+        """
+        Close the session log and release MediaPipe Pose at the end of the session.
+        """
+        if self.recorder is not None:
+            self.recorder.close()
+        self.pose.close()
+
+    def get_session_summary(self, fps=30.0):
+        """
+        Get the summary of the session analytics.
+
+        Args:
+            fps (float): Frame rate of the analyzed video. Default is 30.
+
+        Returns:
+            dict: The session summary of SessionAnalytics, None if the exercise was not recognized.
+        """
+        if self.exercise_data is None:
+            return None
+        return self.analytics.summary(fps=fps)
+
+    def load_recognition_model(self):
+        """
+        Download and load the classifier used for the automatic exercise recognition.
+
+        Returns:
+            keras.Model: Loaded classifier, or None if it could not be loaded.
+        """
+        model = self.get_model(recognition_params['ExerciseID'])
+        if model is None:
+            print("Error loading the exercise recognition model")
+        return model
+
+    def get_model(self, exercise_id):
+        """
+        Get a model from the process-wide model cache, downloading and loading it on a cache miss.
+
+        Args:
+            exercise_id (int): ID of the model.
+
+        Returns:
+            keras.Model: Loaded model, or None if it could not be loaded.
+        """
+        model = model_cache.get(exercise_id, timeout=MODEL_WAIT_TIMEOUT)
+        if model is not None:
+            return model
+
+        registered = model_cache.start_loading(exercise_id)
+        if not registered:
+            # Loaded by another session in the meantime, or its load is still in progress
+            model = model_cache.get(exercise_id, timeout=0)
+            if model is not None:
+                return model
+
+        try:
+            # Use a unique file, several models may be downloaded at the same time
+            save_path = f"/tmp/model_{exercise_id}_{uuid.uuid4().hex}.keras"
+            model_file_path = self.download_model(save_path, exercise_id=exercise_id)
+            model = self.load_downloaded_model(model_file_path) if model_file_path else None
+        finally:
+            if registered:
+                model_cache.finish_loading(exercise_id, model)
+        return model
 
     @staticmethod
     def calculate_distance(point1, point2):
@@ -98,6 +360,53 @@ class ExerciseAnalyzer:
         """
         return math.sqrt((point1[0] - point2[0])**2 + (point1[1] - point2[1])**2 + (point1[2] - point2[2])**2)
 
+    @staticmethod
+    def calculate_performance_score(errors):
+        """
+        Calculate the performance score of a frame from the landmark errors.
+
+        Args:
+            errors (list): List of errors for landmarks.
+
+        Returns:
+            float: The score in percent, 100 for a perfect match.
+        """
+        mae = np.mean(errors) if errors else 0
+        if mae:
+            return 100 * (1 - 15 * mae**2)
+        return 100
+
+    @staticmethod
+    def calculate_errors_batch(world_landmarks, predicted_frames, landmark_idx):
+        """
+        Calculate the landmark errors of many frames at once, vectorized like calculate_errors.
+
+        Args:
+            world_landmarks (np.ndarray): Actual world landmarks of shape (frames, 33, 4).
+            predicted_frames (np.ndarray): Predicted coordinates of shape (frames, len(landmark_idx) * 3).
+            landmark_idx (list): Indices of the analyzed landmarks.
+
+        Returns:
+            np.ndarray: Errors of shape (frames, len(landmark_idx)).
+        """
+        actual_coords = world_landmarks[:, landmark_idx, :3]
+        predicted_coords = np.asarray(predicted_frames).reshape(len(actual_coords), len(landmark_idx), 3)
+        return np.linalg.norm(actual_coords - predicted_coords, axis=-1)
+
+    @staticmethod
+    def calculate_performance_scores(errors):
+        """
+        Calculate the performance scores of many frames at once, see calculate_performance_score.
+
+        Args:
+            errors (np.ndarray): Errors of shape (frames, landmarks).
+
+        Returns:
+            np.ndarray: The scores in percent of shape (frames,).
+        """
+        mae = np.mean(errors, axis=-1)
+        return 100 * (1 - 15 * mae**2)
+
     @staticmethod
     def load_downloaded_model(model_path):
         """
@@ -133,12 +442,28 @@ class ExerciseAnalyzer:
             print(f"Error loading model from {model_path}: {e}")
             return None
 
-    def download_model(self, save_path):
+    def download_model(self, save_path, exercise_id=None):
         """
         Download the Keras model from the FastAPI endpoint and save it locally.
 
         Args:
-            api_url (str): URL of the FastAPI model download endpoint.
+            save_path (str): Path to save the downloaded model file.
+            exercise_id (int): ID of the model to download. Default is the analyzed exercise.
+
+        Returns:
+            str: Path to the saved model.
+        """
+        exercise_id = self.exercise_id if exercise_id is None else exercise_id
+        return self.fetch_model_file(self.api_endpoint, exercise_id, save_path)
+
+    @staticmethod
+    def fetch_model_file(api_endpoint, exercise_id, save_path):
+        """
+        Download the Keras model of an exercise from the FastAPI endpoint and save it locally.
+
+        Args:
+            api_endpoint (str): URL of the FastAPI model download endpoint.
+            exercise_id (int): ID of the model to download.
             save_path (str): Path to save the downloaded model file.
 
         Returns:
@@ -146,9 +471,9 @@ class ExerciseAnalyzer:
         """
 
         # Build Endpoint
-        endpoint = self.api_endpoint
+        endpoint = api_endpoint
         params = {
-            'exercise_id': self.exercise_id
+            'exercise_id': exercise_id
         }
 
         # Get Data
@@ -242,33 +567,25 @@ class ExerciseAnalyzer:
             - Repetition Counter
         """
 
-        # Define the rectangle's top-right position
-        height, width, _ = frame.shape  # Get dimensions of the image
-        top_right_x = width - 250  # Adjust width to place the rectangle in the top-right corner
-        top_right_y = 0  # Y-coordinate remains at the top
+        # Score
+        performance_score = self.calculate_performance_score(errors)
 
-        # Draw the rectangle in the top-right corner
-        cv2.rectangle(frame, (top_right_x, top_right_y), (width, 73), (255, 255, 255), -1)
+        # Score box with the Rep Counter in the top-right corner, only the changed values are redrawn
+        self.get_hud(frame).draw_feedback(frame, performance_score, counter)
 
-        # Score
-        mae = np.mean(errors) if errors else 0
-        if mae:
-            performance_score = 100 * (1 - 15 * mae**2)
-        else:
-            performance_score = 100
+    def get_hud(self, frame):
+        """
+        Get the heads-up display for the size of the frame, building it on first use.
 
-        cv2.putText(frame, 'SCORE', (top_right_x + 110,top_right_y+20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 1, cv2.LINE_AA)
-        cv2.putText(frame, f"{int(performance_score)}%",
-                    (top_right_x + 110,top_right_y + 70),
-                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0,0,0), 2, cv2.LINE_AA)
+        Args:
+            frame (ndarray): Current video frame.
 
-        # Rep Counter
-        cv2.putText(frame, 'REPS', (top_right_x,top_right_y+20),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,0,0), 1, cv2.LINE_AA)
-        cv2.putText(frame, str(counter),
-                    (top_right_x,top_right_y + 70),
-                    cv2.FONT_HERSHEY_SIMPLEX, 2, (0,0,0), 2, cv2.LINE_AA)
+        Returns:
+            HudLayer: The cached heads-up display.
+        """
+        if self.hud is None or self.hud.frame_shape != frame.shape[:2]:
+            self.hud = HudLayer(frame.shape, self.exercise_data['Name'], self.hud_layout)
+        return self.hud
 
     def draw_landmarks(self, frame, results):
         """
@@ -355,6 +672,9 @@ class ExerciseAnalyzer:
         exercise_data = exercise_list.get(self.exercise_id)
 
         if exercise_data:
+            # Copy the entry, the shared exercise list must not be modified by a single session
+            exercise_data = dict(exercise_data)
+
             # Get Connections
             exercise_data['Connections'] = self.get_reindexed_connections(exercise_data['Landmarks'])
 
@@ -362,14 +682,10 @@ class ExerciseAnalyzer:
             new_index_list = list(range(len(exercise_data['Landmarks'])))
             exercise_data['IndexMapping'] = {exercise_data['Landmarks'][i]: new_index_list[i] for i in range(len(exercise_data['Landmarks']))}
 
-            # Load the model only when this function is called
-            save_path = "/tmp/model.keras"
-            model_file_path = self.download_model(save_path)
-            if model_file_path:
-                exercise_data['Model'] = self.load_downloaded_model(model_file_path)
-            else:
-                print(f"Error loading model from {model_file_path}")
-                exercise_data['Model'] = None
+            # Load the model only when this function is called, or take it from the model cache
+            exercise_data['Model'] = self.get_model(self.exercise_id)
+            if exercise_data['Model'] is None:
+                print(f"Error loading model for exercise {self.exercise_id}")
 
         return exercise_data
 
@@ -455,6 +771,40 @@ class ExerciseAnalyzer:
         )
 
 
+    def recognize_exercise(self, frame, results):
+        """
+        Process the pose results of a single frame while the exercise is being recognized.
+
+        The full landmark array of every frame is passed to the recognizer. Once the
+        recognizer is confident, the matching exercise model and repetition counter are loaded
+        and the following frames are analyzed as the selected exercise.
+
+        Args:
+            frame (np.ndarray): A single video frame.
+            results (object): Pose estimation results of the frame.
+
+        Returns:
+            np.ndarray: The processed frame with overlays.
+        """
+        if self.recognizer.model is None:
+            cv2.putText(frame, "Exercise recognition not available", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            return frame
+
+        cv2.putText(frame, "Recognizing exercise...", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+        if results.pose_world_landmarks:
+            landmark_array = landmarks_to_array(results.pose_world_landmarks.landmark)
+            exercise_id = self.recognizer.update(landmark_array)
+
+            if exercise_id is not None:
+                print(f"Recognized exercise {exercise_id}")
+                self.load_exercise(exercise_id)
+
+        if results.pose_landmarks:
+            mp.solutions.drawing_utils.draw_landmarks(frame, results.pose_landmarks, self.mp_pose.POSE_CONNECTIONS)
+
+        return frame
+
     def start_exercise(self, frame):
         """
         Process a single frame for the exercise session.
@@ -465,13 +815,48 @@ class ExerciseAnalyzer:
         Returns:
             np.ndarray: The processed frame with overlays.
         """
+        start_time = time.perf_counter()
 
         # Process the frame
         #frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         results = self.pose.process(frame)#(frame_rgb)
 
+        # Record the pose results for a later replay
+        if self.recorder is not None:
+            self.recorder.record(results, frame.shape)
+
+        frame = self.process_results(frame, results)
+
+        # Report the frame latency and follow the degradation level of the governor
+        if self.governor is not None:
+            self.governor.record_latency(time.perf_counter() - start_time)
+            self.frames_processed += 1
+            if self.frames_processed % DEGRADATION_CHECK_INTERVAL == 0:
+                self.apply_degradation(self.governor.get_degradation_level())
+
+        return frame
+
+    def process_results(self, frame, results):
+        """
+        Run all stages after the pose estimation for a single frame.
+
+        Used by start_exercise and by the replay of recorded sessions, which provides the
+        pose results without running MediaPipe.
+
+        Args:
+            frame (np.ndarray): A single video frame.
+            results (object): Pose estimation results of the frame.
+
+        Returns:
+            np.ndarray: The processed frame with overlays.
+        """
+
+        # Recognize the exercise first if it was not selected
+        if self.exercise_data is None:
+            return self.recognize_exercise(frame, results)
+
         # Display Exercise Name
-        cv2.putText(frame, f"{self.exercise_data['Name']}", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        self.get_hud(frame).draw_exercise_name(frame)
 
         if results.pose_world_landmarks:
             world_landmarks = results.pose_world_landmarks.landmark
@@ -481,21 +866,24 @@ class ExerciseAnalyzer:
                 self.current_sequence.append(frame_data)
 
                 if len(self.current_sequence) == self.sequence_length:
-                    sequence_array = np.expand_dims(np.array(self.current_sequence), axis=0).astype(np.float32)
-                    predicted_frame = self.model.predict(sequence_array, verbose=0)[0]
+                    # Limit the number of predictions running at the same time in this process
+                    with self.governor.inference_slot() if self.governor else nullcontext():
+                        predicted_frame = self.predictor.predict(self.current_sequence)
 
                     self.current_sequence.pop(0)
                     # Update Counter
                     self.rep_counter.update(world_landmarks)
                     # Calculate Error
                     errors, self.error_indices = self.calculate_errors(world_landmarks, predicted_frame)
+                    self.predictor.update_stride(errors)
+                    self.analytics.update(errors, self.calculate_performance_score(errors), self.rep_counter)
                     # Show Feedback to the User
                     self.display_feedback(frame, errors, counter=self.rep_counter.get_count())
                     # Draw predicted Landmarks
                     if self.draw_predicted_lm:
                         self.draw_predicted_landmarks(frame, results, predicted_frame)
             else:
-                cv2.putText(frame, "Adjust Position, joints not visible", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                self.get_hud(frame).draw_warning(frame)
 
         if results.pose_landmarks:
             self.draw_landmarks(frame, results)
@@ -0,0 +1,171 @@
+import math
+import time
+from collections import deque
+import numpy as np
+from trainer.params import recognition_params
+
+
+class ExerciseRecognizer:
+    """
+    A class to recognize the performed exercise from a stream of full pose landmark arrays.
+
+    The recognizer buffers the last frames of the shared MediaPipe stream and, every
+    `classify_every` frames, scores a batch of overlapping windows with one call to the
+    classifier. The class probabilities of the batch are averaged, and an exercise is
+    reported once the classification was confident `required_agreements` times in a row.
+
+    The classifier cost is measured on every call. When the amortized cost per frame
+    exceeds `frame_budget_ms`, the classification interval is stretched accordingly.
+
+    Attributes:
+        model (object): Classifier with a `predict` method taking (batch, window_length, 132) inputs.
+        class_exercise_ids (list): Exercise ID for every output class of the classifier.
+        window_length (int): Number of frames per classified window.
+        window_stride (int): Offset in frames between the windows of one batch.
+        batch_size (int): Number of windows scored together.
+        classify_every (int): Minimum number of frames between two classifications.
+        confidence_threshold (float): Minimum mean probability for a confident classification.
+        required_agreements (int): Consecutive confident results needed to report an exercise.
+        frame_budget_ms (float): Allowed classifier cost per frame in milliseconds.
+        buffer (deque): The most recent landmark arrays.
+        classify_cost_ms (float): Moving average of the classifier cost per call in milliseconds.
+    """
+    def __init__(self,
+                 model,
+                 class_exercise_ids=None,
+                 window_length=None,
+                 window_stride=None,
+                 batch_size=None,
+                 classify_every=None,
+                 confidence_threshold=None,
+                 required_agreements=None,
+                 frame_budget_ms=None):
+        """
+        Initialize the ExerciseRecognizer. Arguments left at None use the values of `recognition_params`.
+
+        Args:
+            model (object): Classifier with a `predict` method.
+            class_exercise_ids (list): Exercise ID for every output class of the classifier.
+            window_length (int): Number of frames per classified window.
+            window_stride (int): Offset in frames between the windows of one batch.
+            batch_size (int): Number of windows scored together.
+            classify_every (int): Minimum number of frames between two classifications.
+            confidence_threshold (float): Minimum mean probability for a confident classification.
+            required_agreements (int): Consecutive confident results needed to report an exercise.
+            frame_budget_ms (float): Allowed classifier cost per frame in milliseconds.
+        """
+        def param(value, key):
+            return recognition_params[key] if value is None else value
+
+        self.model = model
+        self.class_exercise_ids = param(class_exercise_ids, 'Class_Exercise_IDs')
+        self.window_length = param(window_length, 'Window_Length')
+        self.window_stride = param(window_stride, 'Window_Stride')
+        self.batch_size = param(batch_size, 'Batch_Size')
+        self.classify_every = param(classify_every, 'Classify_Every')
+        self.confidence_threshold = param(confidence_threshold, 'Confidence_Threshold')
+        self.required_agreements = param(required_agreements, 'Required_Agreements')
+        self.frame_budget_ms = param(frame_budget_ms, 'Frame_Budget_ms')
+
+        # Window start offsets inside the buffer, the newest window ends with the newest frame
+        self.buffer = deque(maxlen=self.window_length + (self.batch_size - 1) * self.window_stride)
+        self.window_starts = [i * self.window_stride for i in range(self.batch_size)]
+
+        self.classify_cost_ms = 0.0
+        self.frames_since_classification = 0
+        self.candidate_id = None
+        self.agreements = 0
+        self.last_probabilities = None
+
+    @property
+    def classification_interval(self):
+        """
+        Number of frames between two classifications, stretched so the cost stays within the frame budget.
+
+        Returns:
+            int: The current classification interval.
+        """
+        if self.frame_budget_ms <= 0:
+            return self.classify_every
+        return max(self.classify_every, math.ceil(self.classify_cost_ms / self.frame_budget_ms))
+
+    @property
+    def cost_per_frame_ms(self):
+        """
+        Amortized classifier cost per frame in milliseconds.
+
+        Returns:
+            float: Classifier cost per call divided by the classification interval.
+        """
+        return self.classify_cost_ms / self.classification_interval
+
+    def reset(self):
+        """
+        Clear the buffered frames and the classification state.
+        """
+        self.buffer.clear()
+        self.frames_since_classification = 0
+        self.candidate_id = None
+        self.agreements = 0
+        self.last_probabilities = None
+
+    def classify(self):
+        """
+        Score the current batch of windows with a single classifier call.
+
+        Returns:
+            np.ndarray: Mean class probabilities over all windows of the batch.
+        """
+        frames = np.asarray(self.buffer, dtype=np.float32).reshape(len(self.buffer), -1)
+        batch = np.stack([frames[start:start + self.window_length] for start in self.window_starts])
+
+        start_time = time.perf_counter()
+        probabilities = self.model.predict(batch, verbose=0)
+        cost_ms = (time.perf_counter() - start_time) * 1000
+
+        # Smooth the measured cost, the first measurement includes tracing and is only used as a start value
+        if self.classify_cost_ms:
+            self.classify_cost_ms = 0.8 * self.classify_cost_ms + 0.2 * cost_ms
+        else:
+            self.classify_cost_ms = cost_ms
+
+        self.last_probabilities = np.mean(probabilities, axis=0)
+        return self.last_probabilities
+
+    def update(self, landmark_array):
+        """
+        Add a frame to the buffer and classify the buffered windows when due.
+
+        Args:
+            landmark_array (np.ndarray): Landmarks of the frame with shape (33, 4).
+
+        Returns:
+            int or None: The recognized exercise ID, or None while the exercise is not yet recognized.
+        """
+        self.buffer.append(landmark_array)
+        self.frames_since_classification += 1
+
+        if len(self.buffer) < self.buffer.maxlen:
+            return None
+        if self.frames_since_classification < self.classification_interval:
+            return None
+        self.frames_since_classification = 0
+
+        probabilities = self.classify()
+        class_idx = int(np.argmax(probabilities))
+
+        if probabilities[class_idx] < self.confidence_threshold:
+            self.candidate_id = None
+            self.agreements = 0
+            return None
+
+        exercise_id = self.class_exercise_ids[class_idx]
+        if exercise_id == self.candidate_id:
+            self.agreements += 1
+        else:
+            self.candidate_id = exercise_id
+            self.agreements = 1
+
+        if self.agreements >= self.required_agreements:
+            return exercise_id
+        return None
@@ -0,0 +1,305 @@
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import cv2
+import numpy as np
+import tensorflow as tf
+
+# Degradation steps applied by the analyzers when the governor is saturated
+DEGRADATION_STEPS = [
+    "full quality",
+    "predicted landmarks disabled",
+    "pose model complexity 0",
+    "prediction stride 3"
+]
+
+
+class ResourceGovernor:
+    """
+    A class to budget the CPU between concurrent analysis sessions of one process.
+
+    The governor caps the TensorFlow thread pools of the process, limits the number of
+    model predictions running at the same time (the per-session share of the intra-op
+    threads), admits at most `max_sessions` sessions, and derives a degradation level from
+    its saturation and the measured frame latency. The analyzers apply the degradation
+    level, so the frame latency of all sessions stays flat up to the session cap instead
+    of collapsing for everyone at once. The level has a hysteresis: the latency step is
+    added above the budget and only removed below `recovery_ratio` of it, and a level is
+    kept for at least `min_level_seconds`, so the analyzers do not switch back and forth
+    while the latency responds to the last change.
+
+    Attributes:
+        max_sessions (int): Maximum number of concurrent sessions.
+        intra_op_threads (int): TensorFlow intra-op threads of the process.
+        inter_op_threads (int): TensorFlow inter-op threads of the process.
+        session_intra_op_threads (int): Intra-op threads budgeted per session.
+        latency_budget_ms (float): Frame latency above which the degradation level is raised.
+        recovery_ratio (float): Share of the latency budget below which the latency step is removed again.
+        min_level_seconds (float): Minimum time a degradation level is kept.
+        active_sessions (int): Number of admitted sessions.
+        level (int): Current degradation level.
+    """
+    def __init__(self,
+                 max_sessions=None,
+                 intra_op_threads=None,
+                 inter_op_threads=1,
+                 session_intra_op_threads=1,
+                 latency_budget_ms=100.0,
+                 recovery_ratio=0.7,
+                 min_level_seconds=5.0,
+                 min_latency_samples=60):
+        """
+        Initialize the ResourceGovernor.
+
+        Args:
+            max_sessions (int): Maximum number of concurrent sessions. Default is the number of CPUs.
+            intra_op_threads (int): TensorFlow intra-op threads of the process. Default is the number of CPUs.
+            inter_op_threads (int): TensorFlow inter-op threads of the process. Default is 1.
+            session_intra_op_threads (int): Intra-op threads budgeted per session. Default is 1.
+            latency_budget_ms (float): Frame latency (p95) above which the degradation level is raised. Default is 100.
+            recovery_ratio (float): Share of the latency budget below which the latency step is removed. Default is 0.7.
+            min_level_seconds (float): Minimum time a degradation level is kept. Default is 5 seconds.
+            min_latency_samples (int): Frame latencies needed after a level change before the latency is evaluated
+                again. Default is 60.
+        """
+        cpus = os.cpu_count() or 1
+        self.max_sessions = max_sessions or cpus
+        self.intra_op_threads = intra_op_threads or cpus
+        self.inter_op_threads = inter_op_threads
+        self.session_intra_op_threads = session_intra_op_threads
+        self.latency_budget_ms = latency_budget_ms
+        self.recovery_ratio = recovery_ratio
+        self.min_level_seconds = min_level_seconds
+        self.min_latency_samples = min_latency_samples
+
+        self.condition = threading.Condition()
+        self.active_sessions = 0
+        self.inference_slots = threading.BoundedSemaphore(max(1, self.intra_op_threads // session_intra_op_threads))
+        self.latencies = deque(maxlen=300)
+        self.level = 0
+        self.level_changed_at = time.monotonic()
+        self.latency_step = 0
+        self.level_lock = threading.Lock()
+
+    def configure_tensorflow(self):
+        """
+        Apply the thread caps to TensorFlow. Must be called before TensorFlow runs its first operation.
+
+        Returns:
+            bool: True if the caps were applied.
+        """
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(self.intra_op_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(self.inter_op_threads)
+            return True
+        except RuntimeError as e:
+            print(f"Error configuring TensorFlow threads, the runtime is already initialized: {e}")
+            return False
+
+    def acquire_session(self, timeout=0):
+        """
+        Admit a new session, waiting in the queue for a free slot up to `timeout` seconds.
+
+        Args:
+            timeout (float): Maximum time to wait for a free slot in seconds. Default is 0 (reject immediately).
+
+        Returns:
+            bool: True if the session was admitted, False if it was rejected.
+        """
+        with self.condition:
+            admitted = self.condition.wait_for(lambda: self.active_sessions < self.max_sessions, timeout)
+            if admitted:
+                self.active_sessions += 1
+            return admitted
+
+    def release_session(self):
+        """
+        Release the slot of a finished session.
+        """
+        with self.condition:
+            self.active_sessions = max(self.active_sessions - 1, 0)
+            self.condition.notify()
+
+    def is_full(self):
+        """
+        Check if all session slots are in use.
+
+        Returns:
+            bool: True if a new session would be rejected.
+        """
+        with self.condition:
+            return self.active_sessions >= self.max_sessions
+
+    @contextmanager
+    def inference_slot(self):
+        """
+        Context manager limiting the number of model predictions running at the same time.
+        """
+        with self.inference_slots:
+            yield
+
+    def record_latency(self, seconds):
+        """
+        Record the processing time of a frame.
+
+        Args:
+            seconds (float): Processing time of the frame in seconds.
+        """
+        self.latencies.append(seconds * 1000)
+
+    def get_p95_latency(self):
+        """
+        Get the 95th percentile of the recent frame latencies.
+
+        Returns:
+            float: Latency in milliseconds, 0 without recorded frames.
+        """
+        latencies = list(self.latencies)
+        return float(np.percentile(latencies, 95)) if latencies else 0.0
+
+    def get_degradation_level(self):
+        """
+        Get the degradation level the analyzers should apply, see DEGRADATION_STEPS.
+
+        The level rises with the share of used session slots, and by one more step once the
+        p95 frame latency exceeds the latency budget, until it drops below `recovery_ratio`
+        of the budget. A new level is only adopted after the current one was kept for
+        `min_level_seconds`, and the latencies measured at the old level are discarded.
+
+        Returns:
+            int: Index into DEGRADATION_STEPS.
+        """
+        saturation = self.active_sessions / self.max_sessions
+        if saturation < 0.75:
+            level = 0
+        elif saturation < 0.9:
+            level = 1
+        elif saturation < 1.0:
+            level = 2
+        else:
+            level = 3
+
+        with self.level_lock:
+            # Only judge the latency on enough frames measured at the current level
+            if len(self.latencies) >= self.min_latency_samples:
+                p95_latency = self.get_p95_latency()
+                if p95_latency > self.latency_budget_ms:
+                    self.latency_step = 1
+                elif p95_latency < self.latency_budget_ms * self.recovery_ratio:
+                    self.latency_step = 0
+
+            level = min(level + self.latency_step, len(DEGRADATION_STEPS) - 1)
+            now = time.monotonic()
+            if level != self.level and now - self.level_changed_at >= self.min_level_seconds:
+                self.level = level
+                self.level_changed_at = now
+                self.latencies.clear()
+            return self.level
+
+
+def run_load_test(analyzer_factory, frames, session_counts, governor, frames_per_session=150, fps=30):
+    """
+    Measure the frame latency with an increasing number of concurrent sessions.
+
+    Every session runs in its own thread, asks the governor for admission, and feeds the
+    looped frames to its analyzer at the given frame rate.
+
+    Args:
+        analyzer_factory (callable): Function returning a new ExerciseAnalyzer using the governor.
+        frames (list): Frames of the test clip, looped by every session.
+        session_counts (list): Numbers of concurrent sessions to test.
+        governor (ResourceGovernor): The governor of the analyzers.
+        frames_per_session (int): Number of frames processed by every session. Default is 150.
+        fps (int): Frame rate at which every session sends frames. Default is 30.
+
+    Returns:
+        list: A dictionary per session count with the admitted and rejected sessions and the latency percentiles.
+    """
+    report = []
+    for session_count in session_counts:
+        latencies = []
+        rejected = []
+        lock = threading.Lock()
+
+        def run_session():
+            if not governor.acquire_session():
+                with lock:
+                    rejected.append(1)
+                return
+            try:
+                analyzer = analyzer_factory()
+                session_latencies = []
+                for i in range(frames_per_session):
+                    frame_start = time.perf_counter()
+                    analyzer.start_exercise(frames[i % len(frames)].copy())
+                    elapsed = time.perf_counter() - frame_start
+                    session_latencies.append(elapsed * 1000)
+                    time.sleep(max(1 / fps - elapsed, 0))
+                with lock:
+                    latencies.extend(session_latencies)
+            finally:
+                governor.release_session()
+
+        threads = [threading.Thread(target=run_session) for _ in range(session_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        report.append({
+            'sessions': session_count,
+            'admitted': session_count - len(rejected),
+            'rejected': len(rejected),
+            'p50_ms': float(np.percentile(latencies, 50)) if latencies else None,
+            'p95_ms': float(np.percentile(latencies, 95)) if latencies else None
+        })
+    return report
+
+
+def main(argv=None):
+    """
+    Command-line entry point for the load test.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    from trainer.exercise_analysis import ExerciseAnalyzer
+
+    parser = argparse.ArgumentParser(description="Measure frame latency percentiles with concurrent sessions.")
+    parser.add_argument("video", help="Test clip, looped by every session")
+    parser.add_argument("--api-endpoint", required=True, help="Model download endpoint")
+    parser.add_argument("--exercise-id", type=int, default=1)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--max-sessions", type=int, default=None)
+    parser.add_argument("--frames", type=int, default=150, help="Frames per session")
+    args = parser.parse_args(argv)
+
+    governor = ResourceGovernor(max_sessions=args.max_sessions)
+    governor.configure_tensorflow()
+
+    frames = []
+    cap = cv2.VideoCapture(args.video)
+    while len(frames) < 300:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    analyzer_factory = lambda: ExerciseAnalyzer(exercise_id=args.exercise_id,
+                                                api_endpoint=args.api_endpoint,
+                                                governor=governor)
+    report = run_load_test(analyzer_factory, frames, args.sessions, governor, frames_per_session=args.frames)
+
+    print(f"Session cap {governor.max_sessions}")
+    print("sessions  admitted  rejected  p50 [ms]  p95 [ms]")
+    for row in report:
+        print(f"{row['sessions']:>8}  {row['admitted']:>8}  {row['rejected']:>8}  "
+              f"{row['p50_ms'] or 0:>8.1f}  {row['p95_ms'] or 0:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import time
+import cv2
+import numpy as np
+from trainer.params import hud_layout
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+VALUE_CHARACTERS = "0123456789%-"
+MAX_CACHED_VALUES = 512
+WARNING_TEXT = "Adjust Position, joints not visible"
+
+
+class TextSprite:
+    """
+    A pre-rendered text with an alpha mask, blended into frames without calling cv2.putText.
+
+    Attributes:
+        alpha (np.ndarray): Coverage of the text, shape (height, width), 0 to 255.
+        sprite (np.ndarray): The text color over the sprite area, shape (height, width, 3).
+        opaque (bool): Whether the text has no partially covered pixels (no anti-aliasing).
+        origin (tuple): Offset (x, y) of the text origin (bottom-left of the baseline) inside the sprite.
+        advance (int): Width of the text as reported by cv2.getTextSize.
+    """
+    def __init__(self, text, scale, thickness, color, line_type=cv2.LINE_8):
+        """
+        Render a text sprite.
+
+        Args:
+            text (str): The text.
+            scale (float): Font scale.
+            thickness (int): Line thickness.
+            color (tuple): BGR color of the text.
+            line_type (int): OpenCV line type, cv2.LINE_AA for anti-aliased text.
+        """
+        (text_width, text_height), baseline = cv2.getTextSize(text, FONT, scale, thickness)
+        pad = thickness + 1
+        self.origin = (pad, text_height + pad)
+        self.advance = text_width
+
+        self.alpha = np.zeros((text_height + baseline + 2 * pad, text_width + 2 * pad), dtype=np.uint8)
+        cv2.putText(self.alpha, text, self.origin, FONT, scale, 255, thickness, line_type)
+        if line_type != cv2.LINE_AA:
+            # Some OpenCV versions smooth thick lines even without cv2.LINE_AA, keep the text binary
+            self.alpha[:] = np.where(self.alpha >= 128, 255, 0)
+        self.opaque = bool(np.all((self.alpha == 0) | (self.alpha == 255)))
+
+        self.sprite = np.empty(self.alpha.shape + (3,), dtype=np.uint8)
+        self.sprite[:] = color
+        self.weights = self.alpha.astype(np.float32) / 255
+        self.inverse_weights = 1 - self.weights
+
+    def blit(self, image, x, y):
+        """
+        Blend the sprite into an image with its origin at (x, y), clipped to the image borders.
+
+        Args:
+            image (np.ndarray): BGR image, modified in place.
+            x (int): X coordinate of the text origin.
+            y (int): Y coordinate of the text baseline.
+        """
+        top, left = y - self.origin[1], x - self.origin[0]
+        y0, x0 = max(top, 0), max(left, 0)
+        y1 = min(top + self.alpha.shape[0], image.shape[0])
+        x1 = min(left + self.alpha.shape[1], image.shape[1])
+        if y0 >= y1 or x0 >= x1:
+            return
+
+        roi = image[y0:y1, x0:x1]
+        area = (slice(y0 - top, y1 - top), slice(x0 - left, x1 - left))
+        if self.opaque:
+            # Copy the text pixels directly into the region of interest
+            cv2.copyTo(self.sprite[area], self.alpha[area], roi)
+        else:
+            roi[:] = cv2.blendLinear(self.sprite[area], roi, self.weights[area], self.inverse_weights[area])
+
+
+class HudLayer:
+    """
+    A class to draw the heads-up display of the analyzer with cached sprites.
+
+    The score box with its static labels, the exercise name and the warning are rendered
+    once per analyzer and frame size. The score and the repetition count are composed from
+    a glyph cache into value patches, which are cached per text, and copied into the cached
+    score box only when a value changes. Every frame then only copies the score box into
+    its region of interest and blends the text sprites, instead of drawing a rectangle and
+    several texts from scratch.
+
+    Attributes:
+        frame_shape (tuple): Frame size (height, width) the layer was built for.
+        layout (dict): The HUD layout, see `hud_layout` in params.
+        box (np.ndarray): The score box including the current values.
+    """
+    def __init__(self, frame_shape, exercise_name, layout=None):
+        """
+        Build the HUD layer for a frame size.
+
+        Args:
+            frame_shape (tuple): Shape of the frames (height, width, ...).
+            exercise_name (str): Name of the exercise.
+            layout (dict): Values overriding the default `hud_layout`. Default is None.
+        """
+        self.frame_shape = tuple(frame_shape[:2])
+        self.layout = {**hud_layout, **(layout or {})}
+        height, width = self.frame_shape
+        layout = self.layout
+
+        # Score box with the static labels, drawn once
+        self.box_x = max(width - layout['Box_Width'], 0)
+        self.box_height = min(layout['Box_Height'], height)
+        self.static_box = np.empty((self.box_height, width - self.box_x, 3), dtype=np.uint8)
+        self.static_box[:] = layout['Box_Color']
+        for label, offset in (('SCORE', layout['Score_Offset']), ('REPS', layout['Reps_Offset'])):
+            cv2.putText(self.static_box, label, (offset, layout['Label_Baseline']), FONT,
+                        layout['Label_Scale'], layout['Text_Color'], layout['Label_Thickness'], cv2.LINE_AA)
+        self.box = self.static_box.copy()
+
+        # Glyph cache for the values
+        self.glyphs = {char: TextSprite(char, layout['Value_Scale'], layout['Value_Thickness'],
+                                        layout['Text_Color'], cv2.LINE_AA)
+                       for char in VALUE_CHARACTERS}
+
+        self.name_sprite = TextSprite(exercise_name, layout['Name_Scale'], layout['Name_Thickness'], layout['Name_Color'])
+        self.warning_sprite = TextSprite(WARNING_TEXT, layout['Warning_Scale'], layout['Warning_Thickness'], layout['Warning_Color'])
+
+        self.value_patches = {}
+        self.shown_values = None
+
+    def get_value_patch(self, text, offset):
+        """
+        Get the score box area showing a value, composing it from the glyph cache on first use.
+
+        Args:
+            text (str): The value as text.
+            offset (int): X offset of the value inside the score box.
+
+        Returns:
+            tuple: The area of the score box (row slice, column slice) and the patch to copy into it.
+        """
+        key = (text, offset)
+        if key not in self.value_patches:
+            glyphs = [self.glyphs[char] for char in text]
+            glyph_height, glyph_width = glyphs[0].alpha.shape
+            pad_x, pad_y = glyphs[0].origin[0], glyphs[0].origin[1]
+            baseline = self.layout['Value_Baseline']
+
+            top, bottom = max(baseline - pad_y, 0), min(baseline - pad_y + glyph_height, self.box_height)
+            left = min(max(offset - pad_x, 0), self.static_box.shape[1])
+            right = min(offset + sum(glyph.advance for glyph in glyphs) + pad_x, self.static_box.shape[1])
+            area = (slice(top, bottom), slice(left, right))
+
+            patch = self.static_box[area].copy()
+            x = offset - left
+            for glyph in glyphs:
+                glyph.blit(patch, x, baseline - top)
+                x += glyph.advance
+
+            if len(self.value_patches) >= MAX_CACHED_VALUES:
+                self.value_patches.clear()
+            self.value_patches[key] = (area, patch)
+        return self.value_patches[key]
+
+    def update_values(self, score, reps):
+        """
+        Redraw the values in the cached score box if they changed.
+
+        Args:
+            score (float): Performance score in percent.
+            reps (int): Repetition count.
+        """
+        values = (int(score), int(reps))
+        if values == self.shown_values:
+            return
+
+        self.box[:] = self.static_box
+        for text, offset in ((f"{values[0]}%", self.layout['Score_Offset']), (str(values[1]), self.layout['Reps_Offset'])):
+            area, patch = self.get_value_patch(text, offset)
+            self.box[area] = patch
+        self.shown_values = values
+
+    def draw_feedback(self, frame, score, reps):
+        """
+        Draw the score box with the current values.
+
+        Args:
+            frame (np.ndarray): Current video frame, modified in place.
+            score (float): Performance score in percent.
+            reps (int): Repetition count.
+        """
+        self.update_values(score, reps)
+        frame[:self.box_height, self.box_x:] = self.box
+
+    def draw_exercise_name(self, frame):
+        """
+        Draw the name of the exercise.
+
+        Args:
+            frame (np.ndarray): Current video frame, modified in place.
+        """
+        self.name_sprite.blit(frame, *self.layout['Name_Position'])
+
+    def draw_warning(self, frame):
+        """
+        Draw the warning that not all joints are visible.
+
+        Args:
+            frame (np.ndarray): Current video frame, modified in place.
+        """
+        self.warning_sprite.blit(frame, *self.layout['Warning_Position'])
+
+
+def draw_hud_uncached(frame, exercise_name, score, reps):
+    """
+    Draw the HUD with cv2.rectangle and cv2.putText on every frame, as a baseline for the benchmark.
+
+    Args:
+        frame (np.ndarray): Current video frame, modified in place.
+        exercise_name (str): Name of the exercise.
+        score (float): Performance score in percent.
+        reps (int): Repetition count.
+    """
+    height, width, _ = frame.shape
+    top_right_x = width - 250
+    cv2.putText(frame, exercise_name, (50, 50), FONT, 1, (255, 255, 255), 2)
+    cv2.rectangle(frame, (top_right_x, 0), (width, 73), (255, 255, 255), -1)
+    cv2.putText(frame, 'SCORE', (top_right_x + 110, 20), FONT, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+    cv2.putText(frame, f"{int(score)}%", (top_right_x + 110, 70), FONT, 2, (0, 0, 0), 2, cv2.LINE_AA)
+    cv2.putText(frame, 'REPS', (top_right_x, 20), FONT, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+    cv2.putText(frame, str(reps), (top_right_x, 70), FONT, 2, (0, 0, 0), 2, cv2.LINE_AA)
+
+
+def benchmark_hud(frame_sizes=((1280, 720), (1920, 1080)), num_frames=600, value_change_every=1, rep_every=60):
+    """
+    Measure the rendering cost of the HUD per frame, uncached versus cached.
+
+    Args:
+        frame_sizes (tuple): Frame sizes (width, height) to measure. Default is 720p and 1080p.
+        num_frames (int): Number of rendered frames per size. Default is 600.
+        value_change_every (int): The score changes every n frames. Default is 1 (every frame).
+        rep_every (int): The repetition count increases every n frames. Default is 60.
+
+    Returns:
+        list: A dictionary per frame size with the milliseconds per frame of both renderers.
+    """
+    exercise_name = "Barbell Biceps Curl"
+    results = []
+
+    for width, height in frame_sizes:
+        frame = np.zeros((height, width, 3), dtype=np.uint8)
+        values = [(100 - (i // value_change_every) % 40, i // rep_every) for i in range(num_frames)]
+        hud = HudLayer(frame.shape, exercise_name)
+
+        # Warm up both renderers before measuring
+        for score, reps in values[:20]:
+            draw_hud_uncached(frame, exercise_name, score, reps)
+            hud.draw_feedback(frame, score, reps)
+
+        start_time = time.perf_counter()
+        for score, reps in values:
+            draw_hud_uncached(frame, exercise_name, score, reps)
+        uncached_ms = (time.perf_counter() - start_time) * 1000 / num_frames
+
+        start_time = time.perf_counter()
+        for score, reps in values:
+            hud.draw_exercise_name(frame)
+            hud.draw_feedback(frame, score, reps)
+        cached_ms = (time.perf_counter() - start_time) * 1000 / num_frames
+
+        results.append({'size': f"{width}x{height}", 'uncached_ms': uncached_ms, 'cached_ms': cached_ms})
+
+    return results
+
+
+if __name__ == "__main__":
+    for result in benchmark_hud():
+        print(f"{result['size']}: putText {result['uncached_ms']:.3f} ms/frame, "
+              f"cached HUD {result['cached_ms']:.3f} ms/frame")
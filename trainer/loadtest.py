@@ -0,0 +1,518 @@
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import cv2
+import numpy as np
+from aiortc import RTCConfiguration, RTCPeerConnection, MediaStreamTrack, VideoStreamTrack
+from aiortc.mediastreams import MediaStreamError
+from av import VideoFrame
+from trainer.params import exercise_list, recognition_params
+
+# The client stamps a frame ID as a row of black and white blocks into the bottom-left corner
+FRAME_ID_BITS = 16
+FRAME_ID_BLOCK = 16
+
+
+def build_stub_models(model_dir):
+    """
+    Build tiny untrained models with the input and output shapes of the real models.
+
+    Args:
+        model_dir (str): Directory to save the models to.
+
+    Returns:
+        dict: Path of the saved model by exercise ID.
+    """
+    from tensorflow.keras import Input, Sequential, layers
+
+    model_paths = {}
+    for exercise_id, exercise in exercise_list.items():
+        features = len(exercise['Landmarks']) * 3
+        model = Sequential([Input((None, features)), layers.LSTM(16), layers.Dense(features)])
+        model_paths[exercise_id] = os.path.join(model_dir, f"model_{exercise_id}.keras")
+        model.save(model_paths[exercise_id])
+
+    model = Sequential([Input((recognition_params['Window_Length'], 33 * 4)),
+                        layers.GlobalAveragePooling1D(),
+                        layers.Dense(len(recognition_params['Class_Exercise_IDs']), activation="softmax")])
+    model_paths[recognition_params['ExerciseID']] = os.path.join(model_dir, "model_recognition.keras")
+    model.save(model_paths[recognition_params['ExerciseID']])
+    return model_paths
+
+
+class StubModelServer:
+    """
+    A local HTTP server answering model downloads like the FastAPI endpoint, for offline load tests.
+
+    Attributes:
+        model_paths (dict): Path of the served model by exercise ID.
+        url (str): URL of the model endpoint, set once started.
+    """
+    def __init__(self, model_paths, port=0):
+        """
+        Initialize the StubModelServer.
+
+        Args:
+            model_paths (dict): Path of the served model by exercise ID.
+            port (int): Port to listen on. Default is 0 (any free port).
+        """
+        self.model_paths = model_paths
+        self.port = port
+        self.server = None
+        self.url = None
+
+    def start(self):
+        """
+        Start serving in a background thread.
+
+        Returns:
+            StubModelServer: The server itself.
+        """
+        model_paths = self.model_paths
+
+        class ModelHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                model_path = model_paths.get(int(query.get('exercise_id', ['-1'])[0]))
+                if model_path is None:
+                    self.send_error(404, "Unknown exercise")
+                    return
+                with open(model_path, "rb") as f:
+                    data = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), ModelHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/model"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        """
+        Stop the server.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def stamp_frame_id(frame, frame_id):
+    """
+    Draw a frame ID as a row of black and white blocks into the bottom-left corner.
+
+    Args:
+        frame (np.ndarray): BGR frame, modified in place.
+        frame_id (int): The ID, only the lowest FRAME_ID_BITS bits are stamped.
+    """
+    top = frame.shape[0] - FRAME_ID_BLOCK
+    for bit in range(FRAME_ID_BITS):
+        value = 255 if (frame_id >> bit) & 1 else 0
+        frame[top:, bit * FRAME_ID_BLOCK:(bit + 1) * FRAME_ID_BLOCK] = value
+
+
+def read_frame_id(frame):
+    """
+    Read the frame ID stamped by stamp_frame_id, robust to compression artifacts.
+
+    Args:
+        frame (np.ndarray): BGR frame.
+
+    Returns:
+        int: The frame ID.
+    """
+    # Sample the center of every block
+    margin = FRAME_ID_BLOCK // 4
+    strip = frame[-FRAME_ID_BLOCK + margin:-margin, :FRAME_ID_BITS * FRAME_ID_BLOCK].mean(axis=(0, 2))
+    blocks = strip.reshape(FRAME_ID_BITS, FRAME_ID_BLOCK)[:, margin:-margin].mean(axis=1)
+    return int(sum(1 << bit for bit, value in enumerate(blocks) if value > 127))
+
+
+def load_clip(path=None, max_frames=300, size=(640, 480)):
+    """
+    Load the frames of the test clip, or generate a synthetic clip without a path.
+
+    Args:
+        path (str): Path of the test clip. Default is None (synthetic clip).
+        max_frames (int): Maximum number of frames to load. Default is 300.
+        size (tuple): Frame size (width, height). Default is 640x480.
+
+    Returns:
+        list: BGR frames.
+    """
+    frames = []
+    if path:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, size))
+        cap.release()
+        return frames
+
+    width, height = size
+    for i in range(max_frames):
+        frame = np.full((height, width, 3), 64, dtype=np.uint8)
+        x = int(width / 2 + width / 4 * np.sin(2 * np.pi * i / 60))
+        cv2.circle(frame, (x, height // 2), 40, (200, 200, 200), -1)
+        frames.append(frame)
+    return frames
+
+
+class LoopedClipTrack(VideoStreamTrack):
+    """
+    A client video track sending the looped test clip at 30 fps, with a frame ID stamped into every frame.
+
+    Attributes:
+        frames (list): Frames of the test clip.
+        send_times (dict): Send time by stamped frame ID.
+        frames_sent (int): Number of frames sent.
+    """
+    def __init__(self, frames, send_times):
+        """
+        Initialize the LoopedClipTrack.
+
+        Args:
+            frames (list): Frames of the test clip.
+            send_times (dict): Dictionary to store the send time of every frame ID in.
+        """
+        super().__init__()
+        self.frames = frames
+        self.send_times = send_times
+        self.frames_sent = 0
+
+    async def recv(self):
+        pts, time_base = await self.next_timestamp()
+        frame = self.frames[self.frames_sent % len(self.frames)].copy()
+        frame_id = self.frames_sent % 2**FRAME_ID_BITS
+        stamp_frame_id(frame, frame_id)
+        self.send_times[frame_id] = time.perf_counter()
+        self.frames_sent += 1
+
+        video_frame = VideoFrame.from_ndarray(frame, format="bgr24")
+        video_frame.pts = pts
+        video_frame.time_base = time_base
+        return video_frame
+
+
+class ProcessorTrack(MediaStreamTrack):
+    """
+    A server video track running VideoProcessor.recv on the received frames, like streamlit-webrtc.
+
+    Frames are received continuously and only the latest one is processed, older frames
+    are dropped while the processor is busy. The processor runs in a thread pool, so a
+    slow session does not block the event loop of the other sessions.
+
+    Attributes:
+        frames_dropped (int): Number of received frames dropped without processing.
+    """
+    kind = "video"
+
+    def __init__(self, track, video_processor, executor):
+        """
+        Initialize the ProcessorTrack.
+
+        Args:
+            track (MediaStreamTrack): The received client track.
+            video_processor (VideoProcessor): The processor of the session.
+            executor (ThreadPoolExecutor): Thread pool running the processor.
+        """
+        super().__init__()
+        self.track = track
+        self.video_processor = video_processor
+        self.executor = executor
+        self.latest_frame = None
+        self.new_frame = asyncio.Event()
+        self.frames_dropped = 0
+        self.reader = asyncio.ensure_future(self.read_frames())
+
+    async def read_frames(self):
+        try:
+            while True:
+                frame = await self.track.recv()
+                if self.latest_frame is not None:
+                    self.frames_dropped += 1
+                self.latest_frame = frame
+                self.new_frame.set()
+        except MediaStreamError:
+            pass
+
+    async def recv(self):
+        await self.new_frame.wait()
+        self.new_frame.clear()
+        frame, self.latest_frame = self.latest_frame, None
+
+        processed_frame = await asyncio.get_running_loop().run_in_executor(self.executor, self.video_processor.recv, frame)
+        processed_frame.pts = frame.pts
+        processed_frame.time_base = frame.time_base
+        return processed_frame
+
+    def stop(self):
+        self.reader.cancel()
+        super().stop()
+
+
+class LoadTestClient:
+    """
+    A synthetic webcam client connected to its own server session through a local peer connection pair.
+
+    Attributes:
+        latencies (list): Glass-to-glass latency of every received frame in seconds.
+        frames_received (int): Number of processed frames received.
+        frames_unmatched (int): Received frames whose frame ID could not be matched to a sent frame.
+    """
+    def __init__(self, frames, video_processor, executor):
+        """
+        Initialize the LoadTestClient.
+
+        Args:
+            frames (list): Frames of the test clip.
+            video_processor (VideoProcessor): The processor of the server session.
+            executor (ThreadPoolExecutor): Thread pool running the processors.
+        """
+        self.send_times = {}
+        self.video_processor = video_processor
+        self.source_track = LoopedClipTrack(frames, self.send_times)
+        self.processor_track = None
+        self.latencies = []
+        self.frames_received = 0
+        self.frames_unmatched = 0
+        self.frames_sent_at_reset = 0
+        self.consumer = None
+
+        # Host candidates only, no STUN or TURN servers
+        self.client_pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+        self.server_pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+        self.client_pc.addTrack(self.source_track)
+
+        @self.server_pc.on("track")
+        def on_server_track(track):
+            self.processor_track = ProcessorTrack(track, video_processor, executor)
+            self.server_pc.addTrack(self.processor_track)
+
+        @self.client_pc.on("track")
+        def on_client_track(track):
+            self.consumer = asyncio.ensure_future(self.consume(track))
+
+    async def connect(self):
+        """
+        Exchange offer and answer between the client and the server peer connection.
+        """
+        await self.client_pc.setLocalDescription(await self.client_pc.createOffer())
+        await self.server_pc.setRemoteDescription(self.client_pc.localDescription)
+        await self.server_pc.setLocalDescription(await self.server_pc.createAnswer())
+        await self.client_pc.setRemoteDescription(self.server_pc.localDescription)
+
+    async def consume(self, track):
+        """
+        Receive the processed frames and match them to the sent frames by their frame ID.
+
+        Args:
+            track (MediaStreamTrack): The processed track of the server.
+        """
+        try:
+            while True:
+                frame = await track.recv()
+                receive_time = time.perf_counter()
+                # VideoProcessor mirrors the frame, flip it back to read the frame ID
+                image = cv2.flip(frame.to_ndarray(format="bgr24"), 1)
+                send_time = self.send_times.pop(read_frame_id(image), None)
+                if send_time is None:
+                    self.frames_unmatched += 1
+                    continue
+                self.latencies.append(receive_time - send_time)
+                self.frames_received += 1
+        except MediaStreamError:
+            pass
+
+    def reset_stats(self):
+        """
+        Discard the statistics collected so far, e.g. after the warm-up.
+        """
+        self.latencies = []
+        self.frames_received = 0
+        self.frames_unmatched = 0
+        self.frames_sent_at_reset = self.source_track.frames_sent
+
+    def get_frames_sent(self):
+        """
+        Get the number of frames sent since the last reset of the statistics.
+
+        Returns:
+            int: Number of frames sent.
+        """
+        return self.source_track.frames_sent - self.frames_sent_at_reset
+
+    async def close(self):
+        """
+        Close both peer connections and end the server session.
+        """
+        if self.consumer is not None:
+            self.consumer.cancel()
+        await self.client_pc.close()
+        await self.server_pc.close()
+        if hasattr(self.video_processor, "on_ended"):
+            self.video_processor.on_ended()
+
+
+def get_rss_mb():
+    """
+    Get the resident set size of the process.
+
+    Returns:
+        float: RSS in megabytes, the peak RSS if /proc is not available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_client_count(processor_factory, frames, client_count, duration, warmup):
+    """
+    Run a number of concurrent clients and measure their statistics.
+
+    Args:
+        processor_factory (callable): Function returning a new VideoProcessor.
+        frames (list): Frames of the test clip.
+        client_count (int): Number of concurrent clients.
+        duration (float): Measured seconds.
+        warmup (float): Seconds before the measurement, to load the models and settle the connections.
+
+    Returns:
+        dict: Statistics of the run.
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=client_count)
+    processors = await asyncio.gather(*[loop.run_in_executor(executor, processor_factory) for _ in range(client_count)])
+    clients = [LoadTestClient(frames, processor, executor) for processor in processors]
+    try:
+        await asyncio.gather(*[client.connect() for client in clients])
+        await asyncio.sleep(warmup)
+
+        for client in clients:
+            client.reset_stats()
+        dropped_at_start = sum(client.processor_track.frames_dropped for client in clients if client.processor_track)
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        await asyncio.sleep(duration)
+        cpu_time, wall_time = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+        latencies = np.array([latency for client in clients for latency in client.latencies]) * 1000
+        frames_sent = sum(client.get_frames_sent() for client in clients)
+        frames_received = sum(client.frames_received for client in clients)
+        percentile = lambda q: float(np.percentile(latencies, q)) if len(latencies) else None
+        return {
+            'clients': client_count,
+            'latency_p50_ms': percentile(50),
+            'latency_p95_ms': percentile(95),
+            'latency_p99_ms': percentile(99),
+            'delivered_fps': frames_received / wall_time / client_count,
+            'frames_sent': frames_sent,
+            'frames_dropped': frames_sent - frames_received,
+            'frames_unmatched': sum(client.frames_unmatched for client in clients),
+            'frames_dropped_server': sum(client.processor_track.frames_dropped for client in clients
+                                         if client.processor_track) - dropped_at_start,
+            'cpu_percent': 100 * cpu_time / wall_time,
+            'rss_mb': get_rss_mb()
+        }
+    finally:
+        await asyncio.gather(*[client.close() for client in clients])
+        executor.shutdown(wait=False)
+
+
+def run_load_test(processor_factory, frames, client_counts, duration=20.0, warmup=5.0):
+    """
+    Measure the webcam pipeline with an increasing number of synthetic WebRTC clients.
+
+    Every client sends the looped test clip at 30 fps through an in-process peer connection
+    to its own server session, which runs VideoProcessor.recv like streamlit-webrtc and
+    sends the processed frames back. The glass-to-glass latency is measured from sending a
+    frame to receiving its processed version. CPU is the time of the server process only,
+    worker processes are not included.
+
+    Args:
+        processor_factory (callable): Function returning a new VideoProcessor.
+        frames (list): Frames of the test clip.
+        client_counts (list): Numbers of concurrent clients to test.
+        duration (float): Measured seconds per client count. Default is 20.
+        warmup (float): Seconds before the measurement of every client count. Default is 5.
+
+    Returns:
+        list: Statistics per client count, see run_client_count.
+    """
+    return [asyncio.run(run_client_count(processor_factory, frames, client_count, duration, warmup))
+            for client_count in client_counts]
+
+
+def main(argv=None):
+    """
+    Command-line entry point for the WebRTC load test.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Load test the webcam pipeline with synthetic WebRTC clients.")
+    parser.add_argument("--clip", default=None, help="Test clip looped by every client. Default is a synthetic clip")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per client count")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds before every measurement")
+    parser.add_argument("--exercise-id", type=int, default=1)
+    parser.add_argument("--api-endpoint", default=None, help="Model endpoint. Default is a local stub with untrained models")
+    parser.add_argument("--max-sessions", type=int, default=None, help="Admit sessions through a ResourceGovernor")
+    parser.add_argument("--worker-process", action="store_true", help="Analyze every session in a worker process")
+    args = parser.parse_args(argv)
+
+    from trainer.governor import ResourceGovernor
+    from utils import VideoProcessor
+
+    governor = None
+    if args.max_sessions:
+        governor = ResourceGovernor(max_sessions=args.max_sessions)
+        governor.configure_tensorflow()
+
+    stub_server = None
+    api_endpoint = args.api_endpoint
+    if api_endpoint is None:
+        model_dir = tempfile.mkdtemp(prefix="stub_models_")
+        stub_server = StubModelServer(build_stub_models(model_dir)).start()
+        api_endpoint = stub_server.url
+
+    processor_factory = lambda: VideoProcessor(exercise_id=args.exercise_id,
+                                               draw_predicted_lm=True,
+                                               error_threshold=0.1,
+                                               visibility_threshold=0.5,
+                                               api_endpoint=api_endpoint,
+                                               sequence_length=10,
+                                               governor=governor,
+                                               use_worker_process=args.worker_process)
+    try:
+        report = run_load_test(processor_factory, load_clip(args.clip), args.clients,
+                               duration=args.duration, warmup=args.warmup)
+    finally:
+        if stub_server is not None:
+            stub_server.stop()
+
+    print("clients  p50 [ms]  p95 [ms]  p99 [ms]  fps/client  dropped  CPU [%]  RSS [MB]")
+    for row in report:
+        print(f"{row['clients']:>7}  {row['latency_p50_ms'] or 0:>8.1f}  {row['latency_p95_ms'] or 0:>8.1f}  "
+              f"{row['latency_p99_ms'] or 0:>8.1f}  {row['delivered_fps']:>10.1f}  "
+              f"{row['frames_dropped']:>7}  {row['cpu_percent']:>7.0f}  {row['rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
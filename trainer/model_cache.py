@@ -0,0 +1,101 @@
+import threading
+
+
+class ModelCache:
+    """
+    A thread-safe, process-wide cache of loaded models, keyed by exercise ID.
+
+    Besides the models, the cache tracks the loading status of every exercise, so a
+    model is only downloaded once even if several sessions or the prefetcher request it
+    at the same time: later requests wait for the load in progress.
+
+    Attributes:
+        models (dict): Loaded models by exercise ID.
+        status (dict): Loading status by exercise ID ('pending', 'downloading', 'loading', 'warming up', 'ready', 'failed').
+    """
+    def __init__(self):
+        """
+        Initialize an empty ModelCache.
+        """
+        self.lock = threading.Lock()
+        self.models = {}
+        self.status = {}
+        self.loading = {}
+
+    def start_loading(self, exercise_id):
+        """
+        Register a load of a model.
+
+        Args:
+            exercise_id (int): ID of the model.
+
+        Returns:
+            bool: True if the caller should load the model, False if it is cached or already being loaded.
+        """
+        with self.lock:
+            if exercise_id in self.models or exercise_id in self.loading:
+                return False
+            self.loading[exercise_id] = threading.Event()
+            self.status[exercise_id] = 'pending'
+            return True
+
+    def set_status(self, exercise_id, status):
+        """
+        Update the loading status of a model.
+
+        Args:
+            exercise_id (int): ID of the model.
+            status (str): The new status.
+        """
+        with self.lock:
+            self.status[exercise_id] = status
+
+    def finish_loading(self, exercise_id, model):
+        """
+        Store a loaded model and wake up all requests waiting for it.
+
+        Args:
+            exercise_id (int): ID of the model.
+            model (object): The loaded model, None if loading failed.
+        """
+        with self.lock:
+            if model is not None:
+                self.models[exercise_id] = model
+            self.status[exercise_id] = 'ready' if model is not None else 'failed'
+            event = self.loading.pop(exercise_id, None)
+        if event is not None:
+            event.set()
+
+    def get(self, exercise_id, timeout=None):
+        """
+        Get a cached model, waiting for a load in progress.
+
+        Args:
+            exercise_id (int): ID of the model.
+            timeout (float): Maximum time to wait for a load in progress in seconds. Default is None (no limit).
+
+        Returns:
+            object: The model, or None if it is not cached.
+        """
+        with self.lock:
+            model = self.models.get(exercise_id)
+            event = self.loading.get(exercise_id)
+        if model is None and event is not None:
+            event.wait(timeout)
+            with self.lock:
+                model = self.models.get(exercise_id)
+        return model
+
+    def get_status(self):
+        """
+        Get the loading status of all models.
+
+        Returns:
+            dict: Loading status by exercise ID.
+        """
+        with self.lock:
+            return dict(self.status)
+
+
+# Cache shared by all analyzers of the process
+model_cache = ModelCache()
@@ -7,7 +7,10 @@ exercise_list = {
                 'Rep_Landmark_ID': 15,
                 'Rep_Axis': 'y',
                 'Min_Threshold': -0.15,
-                'Max_Threshold': -0.3
+                'Max_Threshold': -0.3,
+                'Hysteresis': 0.0,
+                'Smoothing_Window': 1,
+                'Min_Rep_Frames': 0
             },
             2: {
                 'Name': 'Squats',
@@ -16,7 +19,10 @@ exercise_list = {
                 'Rep_Landmark_ID': 23,
                 'Rep_Axis': 'y',
                 'Min_Threshold': 0.0,
-                'Max_Threshold': 0.0
+                'Max_Threshold': 0.0,
+                'Hysteresis': 0.01,
+                'Smoothing_Window': 1,
+                'Min_Rep_Frames': 0
             },
             3: {
                 'Name': 'Deadlift',
@@ -25,9 +31,50 @@ exercise_list = {
                 'Rep_Landmark_ID': 23,
                 'Rep_Axis': 'y',
                 'Min_Threshold': 0.0,
-                'Max_Threshold': 0.0
+                'Max_Threshold': 0.0,
+                'Hysteresis': 0.01,
+                'Smoothing_Window': 1,
+                'Min_Rep_Frames': 0
             }
         }
 
 # Fist of Landmarks, which will not be adjusted for the predicted Frames
 fixed_landmark_idx = [11, 12, 23, 24]
+
+# Parameter used for the automatic exercise recognition
+recognition_params = {
+            'ExerciseID': 0,                    # ID under which the API serves the classifier model
+            'ModelID': "exercise_recognition",
+            'Class_Exercise_IDs': [1, 2, 3],    # Exercise ID for every output class of the classifier
+            'Window_Length': 30,                # Frames per classified window
+            'Window_Stride': 5,                 # Offset in frames between windows of one batch
+            'Batch_Size': 4,                    # Windows scored together in one predict call
+            'Classify_Every': 10,               # Run the classifier every k frames
+            'Confidence_Threshold': 0.8,        # Minimum mean class probability
+            'Required_Agreements': 2,           # Consecutive confident results before switching
+            'Frame_Budget_ms': 2.0              # Allowed classifier cost per frame (amortized)
+        }
+
+# Layout of the heads-up display, x offsets of the score box are relative to its left border
+hud_layout = {
+            'Box_Width': 250,                   # Score box in the top-right corner
+            'Box_Height': 73,
+            'Box_Color': (255, 255, 255),
+            'Text_Color': (0, 0, 0),
+            'Reps_Offset': 0,
+            'Score_Offset': 110,
+            'Label_Baseline': 20,
+            'Label_Scale': 0.5,
+            'Label_Thickness': 1,
+            'Value_Baseline': 70,
+            'Value_Scale': 2,
+            'Value_Thickness': 2,
+            'Name_Position': (50, 50),          # Exercise name
+            'Name_Color': (255, 255, 255),
+            'Name_Scale': 1,
+            'Name_Thickness': 2,
+            'Warning_Position': (50, 100),      # "Adjust Position" warning
+            'Warning_Color': (0, 0, 255),
+            'Warning_Scale': 1,
+            'Warning_Thickness': 2
+        }
@@ -0,0 +1,570 @@
+import argparse
+import time
+import cv2
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import Input, Sequential, layers
+
+# Layers that can be converted to a stateful single-step form
+RECURRENT_LAYERS = (layers.LSTM, layers.GRU, layers.SimpleRNN)
+# Layers that process every timestep independently and can be copied unchanged
+STEPWISE_LAYERS = (layers.Dense, layers.Dropout, layers.Activation, layers.BatchNormalization, layers.LayerNormalization)
+
+
+def build_stateful_model(model, features):
+    """
+    Convert a recurrent sequence model into a stateful model that processes one timestep per call.
+
+    The recurrent layers are rebuilt with `stateful=True` for a batch of one, all other
+    layers are copied unchanged, and the weights of the original model are transferred.
+
+    Args:
+        model (keras.Model): Sequence model built from recurrent and step-wise layers.
+        features (int): Number of features per frame.
+
+    Returns:
+        keras.Model: The stateful single-step model.
+
+    Raises:
+        ValueError: If the model contains a layer without a step-wise form.
+    """
+    step_model = Sequential([Input(batch_shape=(1, 1, features))])
+    converted_layers = []
+
+    for layer in model.layers:
+        if isinstance(layer, layers.InputLayer):
+            continue
+
+        config = layer.get_config()
+        if isinstance(layer, RECURRENT_LAYERS) and not config.get('go_backwards'):
+            config['stateful'] = True
+        elif not isinstance(layer, STEPWISE_LAYERS):
+            raise ValueError(f"Layer {layer.name} ({type(layer).__name__}) does not support step-wise inference")
+
+        step_layer = layer.__class__.from_config(config)
+        step_model.add(step_layer)
+        converted_layers.append((step_layer, layer))
+
+    for step_layer, layer in converted_layers:
+        step_layer.set_weights(layer.get_weights())
+    return step_model
+
+
+class IncrementalPredictor:
+    """
+    A class to run a recurrent sequence model one frame at a time, carrying the hidden state forward.
+
+    On the first frame the model is converted and the state is built by feeding the full
+    window step by step, which is verified against the window-based output of the original
+    model. Afterwards each new frame costs a single timestep. The hidden state also carries
+    frames older than the window, so it is rebuilt every `resync_interval` frames: a second
+    stateful model starts from a zero state and is fed one frame per call alongside the
+    first, and replaces it once it has seen a full window. No frame replays the window, so
+    the cost of every frame stays at most two timesteps, plus one run of the window model on
+    the frames of a drift check.
+
+    Every `check_interval` frames the step output is compared with one run of the window
+    model. When the difference exceeds `drift_tolerance` the window model output is used and
+    a rebuild is started, and after `max_failed_checks` failed checks in a row the window
+    model is used for good.
+
+    Attributes:
+        model (keras.Model): The original window-based sequence model.
+        step_model (keras.Model): The stateful single-step model producing the output, built on the first frame.
+        step_function (tf.function): Compiled call of the step model, avoids the eager overhead per frame.
+        rebuild_model (keras.Model): The stateful single-step model rebuilding the state.
+        rebuild_function (tf.function): Compiled call of the rebuild model.
+        supported (bool): False once the conversion, the verification or the drift checks failed.
+        tolerance (float): Maximum absolute difference accepted by the verification of the conversion.
+        drift_tolerance (float): Maximum absolute difference accepted by the drift checks.
+        resync_interval (int): Number of frames after which a rebuild of the state starts, None for the sequence length.
+        check_interval (int): Number of frames between two drift checks, None for the sequence length.
+        max_failed_checks (int): Number of failed drift checks in a row after which the window model is used.
+        drift_checks (int): Number of drift checks so far.
+        max_drift (float): Largest difference measured by the drift checks.
+    """
+    def __init__(self, model, tolerance=1e-4, drift_tolerance=1e-2, resync_interval=None, check_interval=None,
+                 max_failed_checks=3):
+        """
+        Initialize the IncrementalPredictor.
+
+        Args:
+            model (keras.Model): The window-based sequence model.
+            tolerance (float): Maximum absolute difference accepted by the verification. Default is 1e-4.
+            drift_tolerance (float): Maximum absolute difference accepted by the drift checks. Default is 1e-2.
+            resync_interval (int): Number of frames after which a rebuild of the state starts. Default is None
+                (the sequence length, the state never carries more than two windows).
+            check_interval (int): Number of frames between two drift checks. Default is None (the sequence length).
+            max_failed_checks (int): Failed drift checks in a row after which the window model is used. Default is 3.
+        """
+        self.model = model
+        self.step_model = None
+        self.step_function = None
+        self.rebuild_model = None
+        self.rebuild_function = None
+        self.supported = True
+        self.verified = False
+        self.tolerance = tolerance
+        self.drift_tolerance = drift_tolerance
+        self.resync_interval = resync_interval
+        self.check_interval = check_interval
+        self.max_failed_checks = max_failed_checks
+        self.frames_since_sync = None
+        self.frames_since_check = 0
+        self.rebuild_frames = None
+        self.failed_checks = 0
+        self.drift_checks = 0
+        self.max_drift = 0.0
+
+    def reset(self):
+        """
+        Drop the hidden state, the next frame rebuilds it from the full window.
+        """
+        self.frames_since_sync = None
+        self.rebuild_frames = None
+
+    @staticmethod
+    def run_step(step_function, frame_data):
+        """
+        Feed a single frame to a stateful model.
+
+        Args:
+            step_function (tf.function): Compiled call of the stateful model.
+            frame_data (list): Landmark coordinates of the frame.
+
+        Returns:
+            np.ndarray: Predicted coordinates after this frame.
+        """
+        step_input = np.asarray(frame_data, dtype=np.float32).reshape(1, 1, -1)
+        return step_function(step_input).numpy()[0]
+
+    @staticmethod
+    def reset_states(step_model):
+        """
+        Reset the hidden state of a stateful model to zeros.
+
+        Args:
+            step_model (keras.Model): The stateful model.
+        """
+        for layer in step_model.layers:
+            if hasattr(layer, 'reset_states'):
+                layer.reset_states()
+
+    def step(self, frame_data):
+        """
+        Feed a single frame to the stateful model.
+
+        Args:
+            frame_data (list): Landmark coordinates of the frame.
+
+        Returns:
+            np.ndarray: Predicted coordinates after this frame.
+        """
+        return self.run_step(self.step_function, frame_data)
+
+    def sync(self, sequence):
+        """
+        Rebuild the hidden state from a full window of frames at once, on the first frame and after a reset.
+
+        Args:
+            sequence (list): The last `sequence_length` frames of landmark coordinates.
+
+        Returns:
+            np.ndarray: Predicted coordinates of the last frame of the window.
+        """
+        self.reset_states(self.step_model)
+        for frame_data in sequence:
+            prediction = self.step(frame_data)
+        self.frames_since_sync = 0
+        self.frames_since_check = 0
+        self.rebuild_frames = None
+        return prediction
+
+    def start_rebuild(self, frame_data):
+        """
+        Start rebuilding the state in the rebuild model, beginning with the current frame.
+
+        Args:
+            frame_data (list): Landmark coordinates of the current frame.
+        """
+        self.reset_states(self.rebuild_model)
+        self.run_step(self.rebuild_function, frame_data)
+        self.rebuild_frames = 1
+
+    def predict_window(self, sequence):
+        """
+        Run the original window-based model on a window of frames.
+
+        Args:
+            sequence (list): The last `sequence_length` frames of landmark coordinates.
+
+        Returns:
+            np.ndarray: Predicted coordinates of the last frame of the window.
+        """
+        sequence_array = np.expand_dims(np.array(sequence), axis=0).astype(np.float32)
+        return self.model.predict(sequence_array, verbose=0)[0]
+
+    def check_drift(self, sequence, prediction):
+        """
+        Compare the step output with the window model and start a rebuild of the state if it drifted too far.
+
+        Args:
+            sequence (list): The last `sequence_length` frames of landmark coordinates.
+            prediction (np.ndarray): Output of the stateful model for the current frame.
+
+        Returns:
+            np.ndarray: The step output if it is within the tolerance, otherwise the window model output.
+        """
+        window_prediction = self.predict_window(sequence)
+        drift = float(np.max(np.abs(window_prediction - prediction)))
+        self.drift_checks += 1
+        self.max_drift = max(self.max_drift, drift)
+
+        if drift <= self.drift_tolerance:
+            self.failed_checks = 0
+            return prediction
+
+        self.failed_checks += 1
+        if self.failed_checks >= self.max_failed_checks:
+            print(f"Incremental inference drifted from the window model by {drift}, using the window model")
+            self.supported = False
+        elif self.rebuild_frames is None:
+            self.start_rebuild(sequence[-1])
+        return window_prediction
+
+    def predict(self, sequence):
+        """
+        Get the predicted coordinates for the current frame.
+
+        Args:
+            sequence (list): The last `sequence_length` frames of landmark coordinates, ending with the current frame.
+
+        Returns:
+            np.ndarray or None: Predicted coordinates of the current frame, or None if the model
+            does not support incremental inference and the window model has to be used.
+        """
+        if not self.supported:
+            return None
+
+        if self.verified:
+            if self.frames_since_sync is None:
+                return self.sync(sequence)
+
+            prediction = self.step(sequence[-1])
+            self.frames_since_sync += 1
+            self.frames_since_check += 1
+
+            # Advance a running rebuild by one frame, and switch to the rebuilt state after a full window
+            rebuilt = False
+            if self.rebuild_frames is not None:
+                rebuild_prediction = self.run_step(self.rebuild_function, sequence[-1])
+                self.rebuild_frames += 1
+                if self.rebuild_frames >= len(sequence):
+                    self.step_model, self.rebuild_model = self.rebuild_model, self.step_model
+                    self.step_function, self.rebuild_function = self.rebuild_function, self.step_function
+                    self.frames_since_sync = 0
+                    self.rebuild_frames = None
+                    prediction = rebuild_prediction
+                    rebuilt = True
+            elif self.frames_since_sync >= (self.resync_interval or len(sequence)):
+                self.start_rebuild(sequence[-1])
+
+            # The rebuilt state matches the window model, check the drift on the next frame instead
+            if not rebuilt and self.frames_since_check >= (self.check_interval or len(sequence)):
+                self.frames_since_check = 0
+                prediction = self.check_drift(sequence, prediction)
+            return prediction
+
+        # Convert the model on the first frame and verify it against the window-based output
+        try:
+            self.step_model = build_stateful_model(self.model, len(sequence[-1]))
+            self.rebuild_model = build_stateful_model(self.model, len(sequence[-1]))
+            self.step_function = tf.function(lambda step_input, model=self.step_model: model(step_input, training=False))
+            self.rebuild_function = tf.function(lambda step_input, model=self.rebuild_model: model(step_input, training=False))
+            prediction = self.sync(sequence)
+        except Exception as e:
+            print(f"Incremental inference not supported, using the window model: {e}")
+            self.supported = False
+            return None
+
+        window_prediction = self.predict_window(sequence)
+        difference = float(np.max(np.abs(window_prediction - prediction)))
+        if difference > self.tolerance:
+            print(f"Incremental inference differs from the window model by {difference}, using the window model")
+            self.supported = False
+            return None
+
+        self.verified = True
+        return prediction
+
+
+class SequencePredictor:
+    """
+    A class to predict the reference pose from a sequence of frames with a configurable stride.
+
+    The sequence model only runs on every k-th frame. For the frames in between, the
+    predicted coordinates are extrapolated linearly from the last two model outputs
+    (or the last output is held). With an adaptive stride, k drops back to 1 as soon as
+    the error of the user exceeds the error threshold and grows again while it is low.
+
+    With incremental inference, recurrent models run one timestep per frame through an
+    IncrementalPredictor instead, and the stride is not used. Models that cannot be
+    converted fall back to the window model automatically.
+
+    Attributes:
+        model (object): Sequence model with a `predict` method.
+        prediction_stride (int): Current number of frames between two model runs.
+        adaptive_stride (bool): Whether the stride adapts to the error of the user.
+        max_prediction_stride (int): Largest stride used by the adaptive stride.
+        min_prediction_stride (int): Smallest stride used by the adaptive stride, raised when the session is degraded.
+        error_threshold (float): Mean error above which the adaptive stride falls back to 1.
+        interpolation (str): 'linear' to extrapolate between model runs, 'hold' to repeat the last output.
+        incremental_predictor (IncrementalPredictor): Stateful single-step predictor, None in window mode.
+        frames_predicted (int): Number of frames a prediction was requested for.
+        model_calls (int): Number of frames the model actually ran for.
+    """
+    def __init__(self,
+                 model,
+                 prediction_stride=1,
+                 adaptive_stride=False,
+                 max_prediction_stride=5,
+                 error_threshold=0.1,
+                 interpolation='linear',
+                 incremental=False):
+        """
+        Initialize the SequencePredictor.
+
+        Args:
+            model (object): Sequence model with a `predict` method.
+            prediction_stride (int): Number of frames between two model runs. Default is 1 (every frame).
+            adaptive_stride (bool): Whether the stride adapts to the error of the user. Default is False.
+            max_prediction_stride (int): Largest stride used by the adaptive stride. Default is 5.
+            error_threshold (float): Mean error above which the adaptive stride falls back to 1. Default is 0.1.
+            interpolation (str): 'linear' or 'hold'. Default is 'linear'.
+            incremental (bool): Whether to run recurrent models one timestep per frame. Default is False.
+        """
+        self.model = model
+        self.incremental_predictor = IncrementalPredictor(model) if incremental else None
+        self.prediction_stride = max(1, prediction_stride)
+        self.adaptive_stride = adaptive_stride
+        self.max_prediction_stride = max(1, max_prediction_stride)
+        self.min_prediction_stride = 1
+        self.error_threshold = error_threshold
+        self.interpolation = interpolation
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the previous predictions, the next frame runs the model.
+        """
+        self.frame_idx = -1
+        self.last_prediction = None
+        self.last_prediction_idx = None
+        self.previous_prediction = None
+        self.previous_prediction_idx = None
+        self.frames_predicted = 0
+        self.model_calls = 0
+        if self.incremental_predictor is not None:
+            self.incremental_predictor.reset()
+
+    def run_model(self, sequence):
+        """
+        Run the sequence model on a window of frames.
+
+        Args:
+            sequence (list): The last `sequence_length` frames of landmark coordinates.
+
+        Returns:
+            np.ndarray: Predicted coordinates of the current frame.
+        """
+        sequence_array = np.expand_dims(np.array(sequence), axis=0).astype(np.float32)
+        return self.model.predict(sequence_array, verbose=0)[0]
+
+    def predict(self, sequence):
+        """
+        Get the predicted coordinates for the current frame.
+
+        Args:
+            sequence (list): The last `sequence_length` frames of landmark coordinates, ending with the current frame.
+
+        Returns:
+            np.ndarray: Predicted coordinates of the current frame.
+        """
+        self.frame_idx += 1
+        self.frames_predicted += 1
+
+        if self.incremental_predictor is not None:
+            prediction = self.incremental_predictor.predict(sequence)
+            if prediction is not None:
+                self.model_calls += 1
+                return prediction
+            # The model does not support incremental inference, continue with the window model
+            self.incremental_predictor = None
+
+        if self.last_prediction is None or self.frame_idx - self.last_prediction_idx >= self.prediction_stride:
+            self.previous_prediction, self.previous_prediction_idx = self.last_prediction, self.last_prediction_idx
+            self.last_prediction = self.run_model(sequence)
+            self.last_prediction_idx = self.frame_idx
+            self.model_calls += 1
+            return self.last_prediction
+
+        if self.interpolation == 'hold' or self.previous_prediction is None:
+            return self.last_prediction
+
+        # Extrapolate linearly from the last two model outputs
+        step = (self.last_prediction - self.previous_prediction) / (self.last_prediction_idx - self.previous_prediction_idx)
+        return self.last_prediction + step * (self.frame_idx - self.last_prediction_idx)
+
+    def update_stride(self, errors):
+        """
+        Adapt the stride to the current error of the user.
+
+        Args:
+            errors (list): Errors for each landmark of the current frame.
+        """
+        if not self.adaptive_stride or not errors:
+            return
+
+        if np.mean(errors) > self.error_threshold:
+            self.prediction_stride = self.min_prediction_stride
+        else:
+            self.prediction_stride = max(min(self.prediction_stride + 1, self.max_prediction_stride),
+                                         self.min_prediction_stride)
+
+
+def landmark_distances(coords_a, coords_b):
+    """
+    Calculate the Euclidean distance per landmark between two sets of flat coordinates.
+
+    Args:
+        coords_a (np.ndarray): Coordinates of shape (..., landmarks * 3).
+        coords_b (np.ndarray): Coordinates of shape (..., landmarks * 3).
+
+    Returns:
+        np.ndarray: Distances of shape (..., landmarks).
+    """
+    difference = np.asarray(coords_a) - np.asarray(coords_b)
+    return np.linalg.norm(difference.reshape(*difference.shape[:-1], -1, 3), axis=-1)
+
+
+def stride_report(model, frames, sequence_length, strides=(1, 2, 3, 4, 5), interpolation='linear'):
+    """
+    Compare the accuracy and the cost of different prediction strides on recorded frames.
+
+    Every stride runs a SequencePredictor over the frames like the live session does.
+    The predictions are compared with the ones of stride 1 (error drift) and with the
+    actual frames (error as used for the feedback). The model is warmed up before the
+    timed runs, so the CPU time of stride 1 does not include the graph tracing.
+
+    Args:
+        model (object): Sequence model with a `predict` method.
+        frames (np.ndarray): Landmark coordinates of shape (frames, landmarks * 3), as returned by get_frame_data.
+        sequence_length (int): Number of frames per window.
+        strides (tuple): Strides to compare. Default is 1 to 5.
+        interpolation (str): 'linear' or 'hold'. Default is 'linear'.
+
+    Returns:
+        list: A dictionary per stride containing:
+            - 'stride' (int): The prediction stride.
+            - 'model_calls' (int): Number of model runs.
+            - 'cpu_seconds' (float): CPU time of all predictions.
+            - 'cpu_saved' (float): Fraction of CPU time saved compared to stride 1.
+            - 'mean_drift' (float): Mean landmark distance to the stride 1 predictions.
+            - 'max_drift' (float): Largest landmark distance to the stride 1 predictions.
+            - 'mean_error' (float): Mean landmark distance to the actual frames.
+    """
+    frames = np.asarray(frames, dtype=np.float32)
+
+    def run_stride(stride):
+        predictor = SequencePredictor(model, prediction_stride=stride, interpolation=interpolation)
+        start_time = time.process_time()
+        predictions = np.array([predictor.predict(frames[end - sequence_length:end])
+                                for end in range(sequence_length, len(frames) + 1)])
+        return {'predictions': predictions,
+                'cpu_seconds': time.process_time() - start_time,
+                'model_calls': predictor.model_calls}
+
+    # Warm up the model untimed, the first call includes the tracing of the TensorFlow graph
+    model.predict(np.expand_dims(frames[:sequence_length], axis=0), verbose=0)
+
+    # All strides are compared with stride 1, whether it is in the list or not
+    reference = run_stride(1)
+    report = []
+
+    for stride in strides:
+        result = reference if stride == 1 else run_stride(stride)
+        drift = landmark_distances(result['predictions'], reference['predictions'])
+        errors = landmark_distances(result['predictions'], frames[sequence_length - 1:])
+
+        report.append({
+            'stride': stride,
+            'model_calls': result['model_calls'],
+            'cpu_seconds': result['cpu_seconds'],
+            'cpu_saved': 1 - result['cpu_seconds'] / reference['cpu_seconds'] if reference['cpu_seconds'] else 0.0,
+            'mean_drift': float(np.mean(drift)),
+            'max_drift': float(np.max(drift)),
+            'mean_error': float(np.mean(errors))
+        })
+
+    return report
+
+
+def extract_frame_data(video_path, exercise_analyzer):
+    """
+    Extract the landmark coordinates of all frames of a video in which the exercise landmarks are visible.
+
+    Args:
+        video_path (str): Path of the video.
+        exercise_analyzer (ExerciseAnalyzer): Analyzer of the exercise.
+
+    Returns:
+        np.ndarray: Landmark coordinates of shape (frames, landmarks * 3).
+    """
+    frames = []
+    cap = cv2.VideoCapture(video_path)
+    while cap.isOpened():
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        results = exercise_analyzer.pose.process(frame)
+        if results.pose_world_landmarks:
+            world_landmarks = results.pose_world_landmarks.landmark
+            if exercise_analyzer.are_all_landmarks_visible(world_landmarks):
+                frames.append(exercise_analyzer.get_frame_data(world_landmarks))
+    cap.release()
+    return np.array(frames, dtype=np.float32)
+
+
+def main(argv=None):
+    """
+    Command-line entry point to print the stride report for a video.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    from trainer.exercise_analysis import ExerciseAnalyzer
+
+    parser = argparse.ArgumentParser(description="Report error drift and CPU saved per prediction stride.")
+    parser.add_argument("video", help="Path of the video")
+    parser.add_argument("--exercise-id", type=int, default=1)
+    parser.add_argument("--api-endpoint", required=True, help="Model download endpoint")
+    parser.add_argument("--sequence-length", type=int, default=10)
+    parser.add_argument("--interpolation", choices=["linear", "hold"], default="linear")
+    args = parser.parse_args(argv)
+
+    exercise_analyzer = ExerciseAnalyzer(exercise_id=args.exercise_id,
+                                         api_endpoint=args.api_endpoint,
+                                         sequence_length=args.sequence_length)
+    frames = extract_frame_data(args.video, exercise_analyzer)
+    report = stride_report(exercise_analyzer.model, frames, args.sequence_length, interpolation=args.interpolation)
+
+    print(f"{len(frames)} frames, sequence length {args.sequence_length}")
+    print("stride  model calls  cpu [s]  cpu saved  mean drift  max drift  mean error")
+    for row in report:
+        print(f"{row['stride']:>6}  {row['model_calls']:>11}  {row['cpu_seconds']:>7.2f}  {row['cpu_saved']:>9.0%}  "
+              f"{row['mean_drift']:>10.4f}  {row['max_drift']:>9.4f}  {row['mean_error']:>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from trainer.exercise_analysis import ExerciseAnalyzer
+from trainer.model_cache import model_cache
+from trainer.params import exercise_list, recognition_params
+
+
+class ModelPrefetcher:
+    """
+    A class to download, load and warm up the models of all exercises in the background.
+
+    The models are fetched concurrently in a thread pool and stored in the process-wide
+    model cache, so the first session of every exercise finds its model ready. Each model
+    runs one prediction on a dummy input, so TensorFlow traces `predict` before the first
+    user frame arrives. Starting the prefetcher does not block the caller.
+
+    Attributes:
+        api_endpoint (str): URL of the FastAPI model download endpoint.
+        sequence_length (int): Sequence length of the dummy input for the warm-up.
+        max_workers (int): Number of models fetched at the same time.
+        thread (threading.Thread): The background thread, None before start.
+    """
+    def __init__(self, api_endpoint, sequence_length=10, max_workers=4):
+        """
+        Initialize the ModelPrefetcher.
+
+        Args:
+            api_endpoint (str): URL of the FastAPI model download endpoint.
+            sequence_length (int): Sequence length of the dummy input for the warm-up. Default is 10.
+            max_workers (int): Number of models fetched at the same time. Default is 4.
+        """
+        self.api_endpoint = api_endpoint
+        self.sequence_length = sequence_length
+        self.max_workers = max_workers
+        self.thread = None
+
+    def get_dummy_inputs(self):
+        """
+        Get the dummy input for the warm-up of every model.
+
+        Returns:
+            dict: Dummy input of shape (batch, sequence_length, features) by exercise ID.
+        """
+        dummy_inputs = {exercise_id: np.zeros((1, self.sequence_length, len(exercise['Landmarks']) * 3), dtype=np.float32)
+                        for exercise_id, exercise in exercise_list.items()}
+
+        # The recognizer scores batches of windows of all 33 landmarks with x, y, z and visibility
+        dummy_inputs[recognition_params['ExerciseID']] = np.zeros(
+            (recognition_params['Batch_Size'], recognition_params['Window_Length'], 33 * 4), dtype=np.float32)
+        return dummy_inputs
+
+    def prefetch(self, exercise_id, dummy_input):
+        """
+        Download, load and warm up a single model, unless it is cached or already being loaded.
+
+        Args:
+            exercise_id (int): ID of the model.
+            dummy_input (np.ndarray): Input for the warm-up prediction.
+        """
+        if not model_cache.start_loading(exercise_id):
+            return
+
+        model = None
+        try:
+            model_cache.set_status(exercise_id, 'downloading')
+            save_path = f"/tmp/model_{exercise_id}_{uuid.uuid4().hex}.keras"
+            model_file_path = ExerciseAnalyzer.fetch_model_file(self.api_endpoint, exercise_id, save_path)
+
+            if model_file_path:
+                model_cache.set_status(exercise_id, 'loading')
+                model = ExerciseAnalyzer.load_downloaded_model(model_file_path)
+
+            if model is not None:
+                model_cache.set_status(exercise_id, 'warming up')
+                model.predict(dummy_input, verbose=0)
+        except Exception as e:
+            print(f"Error prefetching model {exercise_id}: {e}")
+        finally:
+            model_cache.finish_loading(exercise_id, model)
+
+    def run(self):
+        """
+        Prefetch all models concurrently and wait until all are done.
+        """
+        dummy_inputs = self.get_dummy_inputs()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for exercise_id, dummy_input in dummy_inputs.items():
+                executor.submit(self.prefetch, exercise_id, dummy_input)
+        print(f"Model prefetch finished: {model_cache.get_status()}")
+
+    def start(self):
+        """
+        Start prefetching in a background thread and return immediately.
+
+        Returns:
+            ModelPrefetcher: The prefetcher itself.
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="model-prefetch", daemon=True)
+            self.thread.start()
+        return self
+
+    @staticmethod
+    def get_readiness():
+        """
+        Get the readiness of every model for display.
+
+        Returns:
+            dict: Loading status by exercise name, 'not loaded' for models that were not requested yet.
+        """
+        status = model_cache.get_status()
+        names = {exercise_id: exercise['Name'] for exercise_id, exercise in exercise_list.items()}
+        names[recognition_params['ExerciseID']] = "Exercise Recognition"
+        return {name: status.get(exercise_id, 'not loaded') for exercise_id, name in names.items()}
@@ -0,0 +1,307 @@
+import os
+import shutil
+import tempfile
+import time
+from fractions import Fraction
+from io import BytesIO
+import av
+import cv2
+from trainer.utils import save_temp_video, get_analysis_range, iter_video_frames
+
+# Codecs tried in order for the output segments, H.264 plays in browsers, MPEG-4 is the fallback
+OUTPUT_CODECS = ("h264", "mpeg4")
+
+# Muxer flags writing a fragmented MP4, playable before the file is finalized
+FRAGMENTED_MP4_OPTIONS = {"movflags": "frag_keyframe+empty_moov+default_base_moof"}
+
+
+def select_codec(codecs=OUTPUT_CODECS):
+    """
+    Select the first video encoder available in the PyAV build.
+
+    Args:
+        codecs (tuple): Codec names in order of preference. Default is H.264, then MPEG-4.
+
+    Returns:
+        str: Name of the codec.
+    """
+    for codec in codecs:
+        try:
+            av.Codec(codec, "w")
+            return codec
+        except Exception:
+            continue
+    raise ValueError(f"None of the codecs {codecs} is available")
+
+
+class SegmentWriter:
+    """
+    A class to write processed frames into a sequence of fragmented MP4 segments.
+
+    Every segment is a standalone video that can be previewed as soon as it is closed.
+    The first segment is short, so the first preview is available after a few frames
+    regardless of the length of the input. The segments are joined into the final video
+    by concat_segments without encoding them again.
+
+    Attributes:
+        output_dir (str): Directory of the segment files.
+        fps (float): Frame rate of the output.
+        width (int): Frame width of the output, rounded down to an even number.
+        height (int): Frame height of the output, rounded down to an even number.
+        codec (str): Name of the video encoder.
+        segments (list): Paths of the completed segments.
+    """
+    def __init__(self, output_dir, fps, width, height, first_segment_seconds=1.0, segment_seconds=5.0, codec=None):
+        """
+        Initialize the SegmentWriter.
+
+        Args:
+            output_dir (str): Directory of the segment files.
+            fps (float): Frame rate of the output.
+            width (int): Frame width of the output.
+            height (int): Frame height of the output.
+            first_segment_seconds (float): Duration of the first segment. Default is 1 second.
+            segment_seconds (float): Duration of the following segments. Default is 5 seconds.
+            codec (str): Name of the video encoder. Default is the first available of OUTPUT_CODECS.
+        """
+        self.output_dir = output_dir
+        self.fps = fps
+        self.rate = Fraction(fps).limit_denominator(1000)
+        # yuv420p needs even frame sizes
+        self.width = width - width % 2
+        self.height = height - height % 2
+        self.codec = codec or select_codec()
+        self.first_segment_frames = max(1, round(first_segment_seconds * fps))
+        self.segment_frames = max(1, round(segment_seconds * fps))
+        self.segments = []
+        self.container = None
+        self.stream = None
+        self.segment_frame_count = 0
+
+    def open_segment(self):
+        """
+        Open the container of the next segment.
+        """
+        path = os.path.join(self.output_dir, f"segment_{len(self.segments):05d}.mp4")
+        self.container = av.open(path, mode="w", options=FRAGMENTED_MP4_OPTIONS)
+        self.stream = self.container.add_stream(self.codec, rate=self.rate)
+        self.stream.width = self.width
+        self.stream.height = self.height
+        self.stream.pix_fmt = "yuv420p"
+        self.segment_path = path
+        self.segment_frame_count = 0
+
+    def close_segment(self):
+        """
+        Flush the encoder and close the current segment.
+
+        Returns:
+            str: Path of the completed segment.
+        """
+        for packet in self.stream.encode():
+            self.container.mux(packet)
+        self.container.close()
+        self.container = None
+        self.segments.append(self.segment_path)
+        return self.segment_path
+
+    def write(self, frame):
+        """
+        Encode a BGR frame into the current segment.
+
+        Args:
+            frame (np.ndarray): Processed BGR frame.
+
+        Returns:
+            str: Path of the segment completed by this frame, None if the segment is still open.
+        """
+        if self.container is None:
+            self.open_segment()
+
+        video_frame = av.VideoFrame.from_ndarray(frame, format="bgr24")
+        video_frame = video_frame.reformat(width=self.width, height=self.height, format="yuv420p")
+        video_frame.pts = self.segment_frame_count
+        video_frame.time_base = 1 / self.rate
+        for packet in self.stream.encode(video_frame):
+            self.container.mux(packet)
+        self.segment_frame_count += 1
+
+        segment_frames = self.first_segment_frames if not self.segments else self.segment_frames
+        if self.segment_frame_count >= segment_frames:
+            return self.close_segment()
+        return None
+
+    def close(self):
+        """
+        Close the last segment.
+
+        Returns:
+            str: Path of the last segment, None if it was already closed.
+        """
+        if self.container is not None:
+            return self.close_segment()
+        return None
+
+
+def concat_segments(segment_paths, output_path):
+    """
+    Join video segments into a single MP4 file by remuxing their packets.
+
+    Args:
+        segment_paths (list): Paths of the segments, all encoded with the same settings.
+        output_path (str): Path of the joined video.
+    """
+    with av.open(output_path, mode="w") as output:
+        output_stream = None
+        offset = 0
+        for path in segment_paths:
+            with av.open(path) as segment:
+                input_stream = segment.streams.video[0]
+                if output_stream is None:
+                    output_stream = output.add_stream(template=input_stream)
+
+                end = offset
+                for packet in segment.demux(input_stream):
+                    # Skip the empty packet flushing the demuxer
+                    if packet.dts is None:
+                        continue
+                    packet.pts += offset
+                    packet.dts += offset
+                    end = max(end, packet.pts + (packet.duration or 0))
+                    packet.stream = output_stream
+                    output.mux(packet)
+                offset = end
+
+
+def process_uploaded_video_progressive(input_video_bytes, exercise_analyzer, progress_callback=None,
+                                       start_time=None, end_time=None, analysis_fps=None,
+                                       first_segment_seconds=1.0, segment_seconds=5.0, progress_interval=15):
+    """
+    Process the uploaded video and report the results progressively while processing.
+
+    The processed frames are written into fragmented MP4 segments. The progress callback
+    is called every `progress_interval` frames and whenever a segment is completed, so a
+    preview of the processed video and the live repetition and score totals can be shown
+    long before the whole video is processed. The time to the first feedback, the first
+    completed segment, is measured from the start of the call.
+
+    Args:
+        input_video_bytes (BytesIO): Input video as a BytesIO object.
+        exercise_analyzer (ExerciseAnalyzer): Instance of ExerciseAnalyzer.
+        progress_callback (callable): Called with a progress dictionary, see below. Default is None.
+        start_time (float): Start of the analyzed range in seconds. Default is None (start of the video).
+        end_time (float): End of the analyzed range in seconds. Default is None (end of the video).
+        analysis_fps (float): Frame rate to analyze. Default is None (native frame rate).
+        first_segment_seconds (float): Duration of the first segment. Default is 1 second.
+        segment_seconds (float): Duration of the following segments. Default is 5 seconds.
+        progress_interval (int): Number of frames between two progress reports. Default is 15.
+
+    The progress dictionary contains:
+        - 'frames_processed' (int): Number of frames processed.
+        - 'total_frames' (int): Estimated number of frames to process.
+        - 'progress' (float): Processed share from 0 to 1.
+        - 'fps' (float): Processing speed in frames per second.
+        - 'eta_seconds' (float): Estimated remaining processing time.
+        - 'reps' (int): Repetitions counted so far, None while the exercise is not recognized.
+        - 'mean_score' (float): Mean performance score so far, None without analyzed frames.
+        - 'segment' (str): Path of the segment completed with this report, None otherwise.
+        - 'time_to_first_feedback' (float): Seconds until the first segment was completed, None before.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'success' (bool): Whether the video was processed successfully.
+            - 'processed_video_bytes' (BytesIO): Processed video as a BytesIO object.
+            - 'frames_processed' (int): Number of frames processed.
+            - 'analysis_fps' (float): Frame rate the video was analyzed at.
+            - 'time_to_first_feedback' (float): Seconds until the first segment was completed.
+            - 'session_summary' (dict): Session analytics of the analyzer, None if not available.
+    """
+    call_start = time.perf_counter()
+    segment_dir = tempfile.mkdtemp(prefix="segments_")
+    sequence_length = exercise_analyzer.sequence_length
+    input_temp_file = save_temp_video(input_video_bytes)
+    try:
+        cap = cv2.VideoCapture(input_temp_file)
+        if not cap.isOpened():
+            print("Error: Unable to open input video file.")
+            return {"success": False, "processed_video_bytes": None, "frames_processed": 0}
+
+        analysis_range = get_analysis_range(cap, start_time, end_time, analysis_fps)
+        output_fps = analysis_range["analysis_fps"]
+        total_frames = max(analysis_range["frames_to_analyze"], 1)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        if analysis_range["frame_step"] > 1:
+            exercise_analyzer.set_sequence_length(max(1, round(sequence_length / analysis_range["frame_step"])))
+            exercise_analyzer.set_frame_step(analysis_range["frame_step"])
+
+        writer = SegmentWriter(segment_dir, output_fps, width, height,
+                               first_segment_seconds=first_segment_seconds, segment_seconds=segment_seconds)
+        frames_processed = 0
+        processing_start = time.perf_counter()
+        time_to_first_feedback = None
+
+        def report(segment):
+            elapsed = time.perf_counter() - processing_start
+            fps = frames_processed / elapsed if elapsed > 0 else 0.0
+            summary = exercise_analyzer.get_session_summary(fps=output_fps)
+            progress_callback({
+                "frames_processed": frames_processed,
+                "total_frames": total_frames,
+                "progress": min(frames_processed / total_frames, 1.0),
+                "fps": fps,
+                "eta_seconds": max(total_frames - frames_processed, 0) / fps if fps else None,
+                "reps": summary["reps"] if summary else None,
+                "mean_score": summary["mean_score"] if summary else None,
+                "segment": segment,
+                "time_to_first_feedback": time_to_first_feedback
+            })
+
+        for _, frame in iter_video_frames(cap, start_time, end_time, analysis_range["frame_step"]):
+            processed_frame = exercise_analyzer.start_exercise(frame)
+            segment = writer.write(processed_frame)
+            frames_processed += 1
+
+            if segment is not None and time_to_first_feedback is None:
+                time_to_first_feedback = time.perf_counter() - call_start
+            if progress_callback is not None and (segment is not None or frames_processed % progress_interval == 0):
+                report(segment)
+
+        cap.release()
+        segment = writer.close()
+        if segment is not None and time_to_first_feedback is None:
+            time_to_first_feedback = time.perf_counter() - call_start
+        if progress_callback is not None:
+            report(segment)
+
+        if not writer.segments:
+            print("Error: No frames in the selected range.")
+            return {"success": False, "processed_video_bytes": None, "frames_processed": 0}
+
+        # Join the segments into the final video
+        output_path = os.path.join(segment_dir, "processed_video.mp4")
+        concat_segments(writer.segments, output_path)
+        with open(output_path, "rb") as f:
+            processed_video_bytes = BytesIO(f.read())
+
+        print(f"Video processing complete, first feedback after {time_to_first_feedback:.2f} s.")
+        return {"success": True,
+                "processed_video_bytes": processed_video_bytes,
+                "frames_processed": frames_processed,
+                "analysis_fps": output_fps,
+                "time_to_first_feedback": time_to_first_feedback,
+                "session_summary": exercise_analyzer.get_session_summary(fps=output_fps)}
+    except Exception as e:
+        print(f"Error processing video: {e}")
+        return {"success": False, "processed_video_bytes": None, "frames_processed": 0}
+    finally:
+        if exercise_analyzer.sequence_length != sequence_length:
+            exercise_analyzer.set_sequence_length(sequence_length)
+        if exercise_analyzer.frame_step != 1:
+            exercise_analyzer.set_frame_step(1)
+
+        # Cleanup temporary files, the caller copies the segments it wants to keep in the callback
+        if os.path.exists(input_temp_file):
+            os.remove(input_temp_file)
+        shutil.rmtree(segment_dir, ignore_errors=True)
@@ -0,0 +1,306 @@
+import argparse
+import os
+import time
+from types import SimpleNamespace
+import numpy as np
+from mediapipe.framework.formats.landmark_pb2 import Landmark, LandmarkList, NormalizedLandmark, NormalizedLandmarkList
+from trainer.utils import landmarks_to_array
+
+NUM_LANDMARKS = 33
+LOG_MAGIC = b"TRAINLOG"
+LOG_VERSION = 1
+
+# File header, written once when the log is created
+HEADER_DTYPE = np.dtype([('magic', 'S8'),
+                         ('version', '<u4'),
+                         ('num_landmarks', '<u4'),
+                         ('width', '<u4'),
+                         ('height', '<u4'),
+                         ('exercise_id', '<i4'),
+                         ('reserved', '<u4')])
+
+# Fixed-size record appended for every frame, so the log can be memory-mapped as an array of records
+RECORD_DTYPE = np.dtype([('timestamp', '<f8'),
+                         ('frame_idx', '<u8'),
+                         ('has_landmarks', 'u1'),
+                         ('has_world_landmarks', 'u1'),
+                         ('padding', 'u1', (6,)),
+                         ('landmarks', '<f4', (NUM_LANDMARKS, 4)),
+                         ('world_landmarks', '<f4', (NUM_LANDMARKS, 4))])
+
+
+class SessionRecorder:
+    """
+    A class to record the pose results of a session to a compact, append-only binary log.
+
+    Every frame is stored as one fixed-size record with the timestamp, the landmarks and
+    the world landmarks (x, y, z and visibility). The log is created on the first frame,
+    when the frame size is known, and appended to if it already exists.
+
+    Attributes:
+        path (str): Path of the session log.
+        exercise_id (int): ID of the recorded exercise.
+        frames_recorded (int): Number of frames recorded by this recorder.
+    """
+    def __init__(self, path, exercise_id=-1):
+        """
+        Initialize the SessionRecorder.
+
+        Args:
+            path (str): Path of the session log.
+            exercise_id (int): ID of the recorded exercise, stored in the header. Default is -1 (unknown).
+        """
+        self.path = path
+        self.exercise_id = exercise_id
+        self.file = None
+        self.frames_recorded = 0
+        self.record_buffer = np.zeros(1, dtype=RECORD_DTYPE)
+
+    def open(self, frame_shape):
+        """
+        Open the log for appending, writing the header if the log is new.
+
+        Args:
+            frame_shape (tuple): Shape of the recorded frames (height, width, channels).
+        """
+        is_new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if not is_new:
+            # Drop a truncated last record so the new records stay aligned
+            self.frames_recorded = (os.path.getsize(self.path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+            os.truncate(self.path, HEADER_DTYPE.itemsize + self.frames_recorded * RECORD_DTYPE.itemsize)
+        self.file = open(self.path, "ab")
+
+        if is_new:
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header['magic'] = LOG_MAGIC
+            header['version'] = LOG_VERSION
+            header['num_landmarks'] = NUM_LANDMARKS
+            header['height'], header['width'] = frame_shape[:2]
+            header['exercise_id'] = self.exercise_id
+            self.file.write(header.tobytes())
+
+    def set_exercise_id(self, exercise_id):
+        """
+        Change the exercise ID in the header, e.g. once the exercise of the session is recognized.
+
+        Args:
+            exercise_id (int): ID of the recorded exercise.
+        """
+        self.exercise_id = exercise_id
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < HEADER_DTYPE.itemsize:
+            # The header is written with the new ID when the log is opened
+            return
+
+        if self.file is not None:
+            self.file.flush()
+        with open(self.path, "r+b") as f:
+            f.seek(HEADER_DTYPE.fields['exercise_id'][1])
+            f.write(np.array(exercise_id, dtype=HEADER_DTYPE['exercise_id']).tobytes())
+
+    def record(self, results, frame_shape, timestamp=None):
+        """
+        Append the pose results of a frame to the log.
+
+        Args:
+            results (object): Pose estimation results of the frame.
+            frame_shape (tuple): Shape of the frame (height, width, channels).
+            timestamp (float): Time of the frame in seconds. Default is the current time.
+        """
+        if self.file is None:
+            self.open(frame_shape)
+
+        record = self.record_buffer[0]
+        record['timestamp'] = time.time() if timestamp is None else timestamp
+        record['frame_idx'] = self.frames_recorded
+        record['has_landmarks'] = results.pose_landmarks is not None
+        record['has_world_landmarks'] = results.pose_world_landmarks is not None
+        record['landmarks'] = landmarks_to_array(results.pose_landmarks.landmark) if results.pose_landmarks else 0
+        record['world_landmarks'] = landmarks_to_array(results.pose_world_landmarks.landmark) if results.pose_world_landmarks else 0
+
+        # Flush every record, so a crashed session loses at most the frame being written
+        self.file.write(self.record_buffer.tobytes())
+        self.file.flush()
+        self.frames_recorded += 1
+
+    def close(self):
+        """
+        Close the log.
+        """
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SessionLog:
+    """
+    A class to read a session log through a memory map.
+
+    A truncated last record, e.g. from an interrupted session, is ignored.
+
+    Attributes:
+        path (str): Path of the session log.
+        header (np.void): The header of the log.
+        records (np.ndarray): Memory-mapped array of all complete records.
+    """
+    def __init__(self, path):
+        """
+        Open a session log.
+
+        Args:
+            path (str): Path of the session log.
+
+        Raises:
+            ValueError: If the file is not a session log of a supported version.
+        """
+        self.path = path
+        self.header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)[0]
+        if self.header['magic'] != LOG_MAGIC or self.header['version'] != LOG_VERSION:
+            raise ValueError(f"{path} is not a session log of version {LOG_VERSION}")
+
+        num_records = (os.path.getsize(path) - HEADER_DTYPE.itemsize) // RECORD_DTYPE.itemsize
+        if num_records:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_DTYPE.itemsize, shape=(num_records,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def frame_shape(self):
+        """
+        Shape of the recorded frames.
+
+        Returns:
+            tuple: (height, width, 3).
+        """
+        return int(self.header['height']), int(self.header['width']), 3
+
+    @property
+    def exercise_id(self):
+        """
+        ID of the recorded exercise.
+
+        Returns:
+            int: The exercise ID, -1 if unknown.
+        """
+        return int(self.header['exercise_id'])
+
+    @property
+    def timestamps(self):
+        """
+        Timestamps of all frames in seconds.
+
+        Returns:
+            np.ndarray: Array of shape (frames,).
+        """
+        return self.records['timestamp']
+
+    @property
+    def world_landmarks(self):
+        """
+        World landmarks of all frames, zero for frames without pose.
+
+        Returns:
+            np.ndarray: Array of shape (frames, 33, 4).
+        """
+        return self.records['world_landmarks']
+
+    def get_results(self, idx):
+        """
+        Rebuild the pose results of a frame in the format returned by MediaPipe Pose.
+
+        Args:
+            idx (int): Index of the frame.
+
+        Returns:
+            SimpleNamespace: Results with `pose_landmarks` and `pose_world_landmarks` (None for frames without pose).
+        """
+        record = self.records[idx]
+
+        pose_landmarks = None
+        if record['has_landmarks']:
+            pose_landmarks = NormalizedLandmarkList(landmark=[
+                NormalizedLandmark(x=x, y=y, z=z, visibility=visibility)
+                for x, y, z, visibility in record['landmarks'].tolist()])
+
+        pose_world_landmarks = None
+        if record['has_world_landmarks']:
+            pose_world_landmarks = LandmarkList(landmark=[
+                Landmark(x=x, y=y, z=z, visibility=visibility)
+                for x, y, z, visibility in record['world_landmarks'].tolist()])
+
+        return SimpleNamespace(pose_landmarks=pose_landmarks, pose_world_landmarks=pose_world_landmarks)
+
+
+def replay_session(session_log, exercise_analyzer, frame_callback=None):
+    """
+    Feed a recorded session through the stages of an analyzer that follow the pose estimation.
+
+    Neither MediaPipe nor a video decoder is used: the overlays are drawn on a blank frame
+    of the recorded size. For a selected exercise the replay is deterministic, so it can
+    be used for regression and performance runs on recorded traffic.
+
+    Args:
+        session_log (SessionLog): The recorded session.
+        exercise_analyzer (ExerciseAnalyzer): Analyzer to replay the session with.
+        frame_callback (callable): Optional function called with (frame_idx, processed_frame) for every frame.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'frames_processed' (int): Number of replayed frames.
+            - 'seconds' (float): Processing time of the replay.
+            - 'fps' (float): Replayed frames per second.
+            - 'reps' (int): Repetitions counted, None if the exercise was not recognized.
+    """
+    frame = np.zeros(session_log.frame_shape, dtype=np.uint8)
+
+    start_time = time.perf_counter()
+    for idx in range(len(session_log)):
+        frame.fill(0)
+        processed_frame = exercise_analyzer.process_results(frame, session_log.get_results(idx))
+        if frame_callback is not None:
+            frame_callback(idx, processed_frame)
+    seconds = time.perf_counter() - start_time
+
+    return {
+        'frames_processed': len(session_log),
+        'seconds': seconds,
+        'fps': len(session_log) / seconds if seconds else 0.0,
+        'reps': exercise_analyzer.rep_counter.get_count() if exercise_analyzer.exercise_data is not None else None
+    }
+
+
+def main(argv=None):
+    """
+    Command-line entry point to replay a session log.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    from trainer.exercise_analysis import ExerciseAnalyzer
+
+    parser = argparse.ArgumentParser(description="Replay a recorded session without MediaPipe or video decoding.")
+    parser.add_argument("log", help="Path of the session log")
+    parser.add_argument("--api-endpoint", required=True, help="Model download endpoint")
+    parser.add_argument("--exercise-id", type=int, default=None, help="Exercise ID, default is the recorded one")
+    parser.add_argument("--sequence-length", type=int, default=10)
+    parser.add_argument("--prediction-stride", type=int, default=1)
+    parser.add_argument("--incremental-inference", action="store_true")
+    args = parser.parse_args(argv)
+
+    session_log = SessionLog(args.log)
+    exercise_id = session_log.exercise_id if args.exercise_id is None else args.exercise_id
+    exercise_analyzer = ExerciseAnalyzer(exercise_id=exercise_id,
+                                         api_endpoint=args.api_endpoint,
+                                         sequence_length=args.sequence_length,
+                                         prediction_stride=args.prediction_stride,
+                                         incremental_inference=args.incremental_inference)
+
+    result = replay_session(session_log, exercise_analyzer)
+    print(f"Replayed {result['frames_processed']} frames in {result['seconds']:.2f}s "
+          f"({result['fps']:.1f} fps), {result['reps']} reps")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,102 @@
+from collections import deque
+from operator import attrgetter
+import numpy as np
+
+
+def smooth_trajectory(values, smoothing_window=1):
+    """
+    Smooth a trajectory with a causal moving average (low-pass filter).
+
+    The first frames are averaged over the frames available so far, so the output has
+    the same length as the input and every value only depends on past frames.
+
+    Args:
+        values (array-like): Trajectory of shape (frames,).
+        smoothing_window (int): Number of frames to average. 1 disables the smoothing.
+
+    Returns:
+        np.ndarray: Smoothed trajectory of shape (frames,).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if smoothing_window <= 1 or len(values) == 0:
+        return values
+
+    smoothed = np.empty_like(values)
+    for i in range(min(smoothing_window - 1, len(values))):
+        smoothed[i] = np.mean(values[:i + 1])
+    if len(values) >= smoothing_window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, smoothing_window)
+        smoothed[smoothing_window - 1:] = windows.mean(axis=1)
+    return smoothed
+
+
+def count_repetitions(values, min_threshold, max_threshold, hysteresis=0.0, smoothing_window=1, min_rep_frames=0):
+    """
+    Count the repetitions of a whole trajectory in one vectorized pass.
+
+    Uses the same state machine as RepetitionCounter: a repetition starts when the value
+    drops below `max_threshold - hysteresis` and ends when it rises above
+    `min_threshold + hysteresis` again. Repetitions shorter than `min_rep_frames` are
+    discarded. The results are identical to feeding the values one by one to
+    RepetitionCounter.update_value.
+
+    Args:
+        values (array-like): Trajectory of the tracked coordinate with shape (frames,).
+        min_threshold (float): The lower threshold for determining the movement bottom.
+        max_threshold (float): The upper threshold for determining the movement top.
+        hysteresis (float): Margin added around both thresholds to suppress jitter.
+        smoothing_window (int): Number of frames of the moving average applied before counting.
+        min_rep_frames (int): Minimum duration of a repetition in frames.
+
+    Returns:
+        dict: A dictionary containing:
+            - 'count' (int): Number of repetitions.
+            - 'starts' (np.ndarray): Frame index at which every repetition started.
+            - 'ends' (np.ndarray): Frame index at which every repetition was completed.
+            - 'durations' (np.ndarray): Duration of every repetition in frames.
+    """
+    smoothed = smooth_trajectory(values, smoothing_window)
+
+    # Frames at which the state machine receives a 'down' or an 'up' event
+    down = smoothed < max_threshold - hysteresis
+    up = ~down & (smoothed > min_threshold + hysteresis)
+    event_idx = np.flatnonzero(down | up)
+
+    # A repetition starts at the first 'down' event after an 'up' event and ends at the next 'up' event
+    is_down = down[event_idx]
+    previous_down = np.concatenate(([False], is_down[:-1]))
+    starts = event_idx[is_down & ~previous_down]
+    ends = event_idx[~is_down & previous_down]
+    starts = starts[:len(ends)]
+
+    durations = ends - starts
+    valid = durations >= min_rep_frames
+
+    return {
+        'count': int(np.count_nonzero(valid)),
+        'starts': starts[valid],
+        'ends': ends[valid],
+        'durations': durations[valid]
+    }
+
+
 class RepetitionCounter:
-    def __init__(self, landmark_idx, direction_axis='y', threshold=0.1, min_threshold=None, max_threshold=None):
+    def __init__(self, landmark_idx, direction_axis='y', threshold=0.1, min_threshold=None, max_threshold=None,
+                 hysteresis=0.0, smoothing_window=1, min_rep_frames=0):
         """
         A class to count repetitions based on movement along a specific axis.
 
+        This is the streaming counterpart of count_repetitions with O(1) cost per frame.
+
         Args:
             landmark_idx (int): The index of the landmark to track.
             direction_axis (str): The axis along which to track movement ('x', 'y', 'z').
             threshold (float): The threshold value to determine significant movement.
             min_threshold (float): The lower threshold for determining the movement bottom.
             max_threshold (float): The upper threshold for determining the movement top.
+            hysteresis (float): Margin added around both thresholds to suppress jitter.
+            smoothing_window (int): Number of frames of the moving average applied before counting.
+            min_rep_frames (int): Minimum duration of a repetition in frames.
         """
         self.landmark_idx = landmark_idx
         if min_threshold == None and max_threshold == None:
@@ -18,6 +106,19 @@ class RepetitionCounter:
             self.min_threshold = min_threshold
             self.max_threshold = max_threshold
         self.direction_axis = direction_axis
+        self.hysteresis = hysteresis
+        self.smoothing_window = smoothing_window
+        self.min_rep_frames = min_rep_frames
+
+        # Resolve the axis once instead of comparing strings on every frame
+        self.get_axis_value = attrgetter(direction_axis) if direction_axis in ('x', 'y', 'z') else None
+        self.down_threshold = self.max_threshold - hysteresis
+        self.up_threshold = self.min_threshold + hysteresis
+
+        self.window = deque(maxlen=smoothing_window)
+        self.frame_idx = -1
+        self.rep_start = None
+        self.last_rep = None
         self.previous_state = None
         self.counter = 0
 
@@ -32,23 +133,58 @@ class RepetitionCounter:
             return
 
         # Get the coordinate value along the specified axis
-        if self.direction_axis == 'y':
-            current_value = landmarks[self.landmark_idx].y
-        elif self.direction_axis == 'x':
-            current_value = landmarks[self.landmark_idx].x
-        elif self.direction_axis == 'z':
-            current_value = landmarks[self.landmark_idx].z
-        else:
+        if self.get_axis_value is None:
             return
+        self.update_value(self.get_axis_value(landmarks[self.landmark_idx]))
+
+    def update_value(self, value):
+        """
+        Update counter with the coordinate value of the tracked landmark for one frame.
+
+        Args:
+            value (float): Coordinate of the tracked landmark along the direction axis.
+        """
+        self.frame_idx += 1
+
+        if self.smoothing_window > 1:
+            self.window.append(value)
+            value = np.mean(self.window)
 
         # Track state (e.g., 'up' or 'down') based on y-movement and threshold
-        if current_value < self.max_threshold:  # Going down
+        if value < self.down_threshold:  # Going down
             if self.previous_state != 'down':
                 self.previous_state = 'down'
-        elif current_value > self.min_threshold:  # Going up
+                self.rep_start = self.frame_idx
+        elif value > self.up_threshold:  # Going up
             if self.previous_state == 'down':
                 self.previous_state = 'up'
-                self.counter += 1  # Increment repetition count when standing back up
+                # Increment repetition count when standing back up, unless the movement was too short
+                if self.frame_idx - self.rep_start >= self.min_rep_frames:
+                    self.counter += 1
+                    self.last_rep = (self.rep_start, self.frame_idx)
+
+    def set_filter(self, smoothing_window, min_rep_frames):
+        """
+        Change the smoothing window and the minimum repetition duration, e.g. for a lower frame rate.
+
+        Args:
+            smoothing_window (int): Number of frames of the moving average applied before counting.
+            min_rep_frames (int): Minimum duration of a repetition in frames.
+        """
+        self.smoothing_window = smoothing_window
+        self.min_rep_frames = min_rep_frames
+        self.window = deque(self.window, maxlen=smoothing_window)
+
+    def reset(self):
+        """
+        Reset the counter and its state to start a new session.
+        """
+        self.window.clear()
+        self.frame_idx = -1
+        self.rep_start = None
+        self.last_rep = None
+        self.previous_state = None
+        self.counter = 0
 
     def get_count(self):
         """
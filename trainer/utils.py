@@ -1,27 +1,219 @@
 import cv2
 import os
+import time
 import uuid
+import numpy as np
 from io import BytesIO
 
-def process_uploaded_video(input_video_bytes, exercise_analyzer):
+
+def landmarks_to_array(landmarks):
+    """
+    Convert a MediaPipe landmark list into a numpy array.
+
+    Args:
+        landmarks (list): All 33 pose landmarks (e.g. results.pose_world_landmarks.landmark).
+
+    Returns:
+        np.ndarray: Array of shape (33, 4) with x, y, z and visibility of every landmark.
+    """
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in landmarks], dtype=np.float32)
+
+
+def save_temp_video(input_video_bytes):
+    """
+    Write an uploaded video to a temporary file for OpenCV, without moving the read position.
+
+    Args:
+        input_video_bytes (BytesIO): Input video as a BytesIO object.
+
+    Returns:
+        str: Path of the temporary file, removed by the caller.
+    """
+    input_temp_file = f"/tmp/input_video_{uuid.uuid4().hex}.mp4"
+    with open(input_temp_file, "wb") as f:
+        f.write(input_video_bytes.getbuffer())
+    return input_temp_file
+
+
+def get_frame_step(fps, analysis_fps=None):
+    """
+    Get the number of decoded frames per analyzed frame for an analysis frame rate.
+
+    Args:
+        fps (float): Native frame rate of the video.
+        analysis_fps (float): Frame rate to analyze, None to analyze every frame.
+
+    Returns:
+        int: Analyze every n-th frame.
+    """
+    if not analysis_fps or analysis_fps >= fps:
+        return 1
+    return max(1, round(fps / analysis_fps))
+
+
+def iter_video_frames(cap, start_time=None, end_time=None, frame_step=1):
+    """
+    Iterate over the frames of a video to analyze.
+
+    The decoder seeks directly to the start time. Frames between two analyzed frames are
+    only grabbed, not retrieved, which skips their color conversion and copy.
+
+    Args:
+        cap (cv2.VideoCapture): The opened video.
+        start_time (float): Start of the analyzed range in seconds. Default is None (start of the video).
+        end_time (float): End of the analyzed range in seconds. Default is None (end of the video).
+        frame_step (int): Analyze every n-th frame. Default is 1.
+
+    Yields:
+        tuple: Timestamp of the frame in seconds and the frame.
+    """
+    if start_time:
+        cap.set(cv2.CAP_PROP_POS_MSEC, start_time * 1000)
+
+    frame_idx = 0
+    while cap.grab():
+        timestamp = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if end_time is not None and timestamp > end_time:
+            break
+
+        if frame_idx % frame_step == 0:
+            ret, frame = cap.retrieve()
+            if not ret:
+                break
+            yield timestamp, frame
+        frame_idx += 1
+
+
+def get_analysis_range(cap, start_time=None, end_time=None, analysis_fps=None):
+    """
+    Get the video properties and the frames of the analyzed range.
+
+    Args:
+        cap (cv2.VideoCapture): The opened video.
+        start_time (float): Start of the analyzed range in seconds. Default is None.
+        end_time (float): End of the analyzed range in seconds. Default is None.
+        analysis_fps (float): Frame rate to analyze. Default is None (native frame rate).
+
+    Returns:
+        dict: A dictionary containing:
+            - 'fps' (int): Native frame rate.
+            - 'duration' (float): Duration of the video in seconds.
+            - 'frame_step' (int): Analyze every n-th frame.
+            - 'analysis_fps' (float): Effective analysis frame rate.
+            - 'frames_to_decode' (int): Frames decoded in the range.
+            - 'frames_to_analyze' (int): Frames analyzed in the range.
+    """
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = frame_count / fps
+    frame_step = get_frame_step(fps, analysis_fps)
+
+    range_start = min(max(start_time or 0, 0), duration)
+    range_end = min(end_time, duration) if end_time is not None else duration
+    frames_to_decode = max(int((range_end - range_start) * fps), 0)
+
+    return {"fps": fps,
+            "duration": duration,
+            "frame_step": frame_step,
+            "analysis_fps": fps / frame_step,
+            "frames_to_decode": frames_to_decode,
+            "frames_to_analyze": -(-frames_to_decode // frame_step)}
+
+
+def probe_video(input_video_bytes, exercise_analyzer=None, start_time=None, end_time=None,
+                analysis_fps=None, calibration_frames=10):
+    """
+    Estimate the processing time of a video before processing it.
+
+    Reads the video properties, and measures the decoding cost and, if an analyzer is given,
+    the analysis cost on a few frames at the start of the range. The analyzer is reset
+    afterwards, so it can process the video from a clean state.
+
+    Args:
+        input_video_bytes (BytesIO): Input video as a BytesIO object.
+        exercise_analyzer (ExerciseAnalyzer): Analyzer to calibrate the analysis cost with. Default is None.
+        start_time (float): Start of the analyzed range in seconds. Default is None.
+        end_time (float): End of the analyzed range in seconds. Default is None.
+        analysis_fps (float): Frame rate to analyze. Default is None (native frame rate).
+        calibration_frames (int): Number of frames to measure. Default is 10.
+
+    Returns:
+        dict: The analysis range of get_analysis_range, plus:
+            - 'width' (int), 'height' (int): Frame size.
+            - 'decode_ms' (float): Decoding time per frame.
+            - 'analysis_ms' (float): Analysis time per analyzed frame, None without analyzer.
+            - 'estimated_seconds' (float): Estimated processing time, None without analyzer.
+        None if the video cannot be opened.
+    """
+    input_temp_file = save_temp_video(input_video_bytes)
+    try:
+        cap = cv2.VideoCapture(input_temp_file)
+        if not cap.isOpened():
+            print("Error: Unable to open input video file.")
+            return None
+
+        probe = get_analysis_range(cap, start_time, end_time, analysis_fps)
+        probe["width"] = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        probe["height"] = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        # Decoding cost, measured on consecutive frames of the range
+        frames = []
+        start = time.perf_counter()
+        for _, frame in iter_video_frames(cap, start_time, end_time):
+            frames.append(frame)
+            if len(frames) == calibration_frames:
+                break
+        cap.release()
+        probe["decode_ms"] = (time.perf_counter() - start) * 1000 / max(len(frames), 1)
+
+        # Analysis cost, the first frames include the warm-up and make the estimate conservative
+        probe["analysis_ms"] = None
+        probe["estimated_seconds"] = None
+        if exercise_analyzer is not None and frames:
+            start = time.perf_counter()
+            for frame in frames:
+                exercise_analyzer.start_exercise(frame)
+            probe["analysis_ms"] = (time.perf_counter() - start) * 1000 / len(frames)
+            exercise_analyzer.reset()
+
+            probe["estimated_seconds"] = (probe["frames_to_decode"] * probe["decode_ms"] +
+                                          probe["frames_to_analyze"] * probe["analysis_ms"]) / 1000
+        return probe
+    finally:
+        if os.path.exists(input_temp_file):
+            os.remove(input_temp_file)
+
+
+def process_uploaded_video(input_video_bytes, exercise_analyzer, start_time=None, end_time=None, analysis_fps=None):
     """
     Process the uploaded video frame by frame using start_exercise.
+
+    Only the range between start_time and end_time is decoded, and with an analysis frame
+    rate below the native one only every n-th frame is analyzed. The sequence length of the
+    analyzer is scaled by the same factor while processing, so the prediction window covers
+    the same time span, and the processed video is written at the analysis frame rate.
+
     Args:
         input_video_bytes (BytesIO): Input video as a BytesIO object.
         exercise_analyzer (ExerciseAnalyzer): Instance of ExerciseAnalyzer.
+        start_time (float): Start of the analyzed range in seconds. Default is None (start of the video).
+        end_time (float): End of the analyzed range in seconds. Default is None (end of the video).
+        analysis_fps (float): Frame rate to analyze. Default is None (native frame rate).
 
     Returns:
         dict: A dictionary containing:
             - 'success' (bool): Whether the video was processed successfully.
             - 'processed_video_bytes' (BytesIO): Processed video as a BytesIO object.
             - 'frames_processed' (int): Number of frames processed.
+            - 'analysis_fps' (float): Frame rate the video was analyzed at.
+            - 'session_summary' (dict): Session analytics of the analyzer, None if not available.
     """
     processed_video_bytes = BytesIO()
+    output_temp_file = f"/tmp/output_video_{uuid.uuid4().hex}.mp4"
+    sequence_length = exercise_analyzer.sequence_length
     try:
         # Write input BytesIO to a temporary file for OpenCV compatibility
-        input_temp_file = f"/tmp/input_video_{uuid.uuid4().hex}.mp4"
-        with open(input_temp_file, "wb") as f:
-            f.write(input_video_bytes.read())
+        input_temp_file = save_temp_video(input_video_bytes)
 
         # Open input video
         cap = cv2.VideoCapture(input_temp_file)
@@ -30,25 +222,26 @@ def process_uploaded_video(input_video_bytes, exercise_analyzer):
             return {"success": False, "processed_video_bytes": None, "frames_processed": 0}
 
         # Video properties
-        fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
+        analysis_range = get_analysis_range(cap, start_time, end_time, analysis_fps)
+        output_fps = analysis_range["analysis_fps"]
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fourcc = cv2.VideoWriter_fourcc(*'mp4v')
 
+        # Keep the time span of the prediction window and the repetition counter at the lower analysis frame rate
+        if analysis_range["frame_step"] > 1:
+            exercise_analyzer.set_sequence_length(max(1, round(sequence_length / analysis_range["frame_step"])))
+            exercise_analyzer.set_frame_step(analysis_range["frame_step"])
+
         # Write to an in-memory file for processed video
-        output_temp_file = f"/tmp/output_video_{uuid.uuid4().hex}.mp4"
-        out = cv2.VideoWriter(output_temp_file, fourcc, fps, (width, height))
+        out = cv2.VideoWriter(output_temp_file, fourcc, output_fps, (width, height))
         if not out.isOpened():
             print("Error: Unable to initialize VideoWriter.")
             return {"success": False, "processed_video_bytes": None, "frames_processed": 0}
 
         # Process frames
         frames_processed = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-
+        for _, frame in iter_video_frames(cap, start_time, end_time, analysis_range["frame_step"]):
             # Process frame
             processed_frame = exercise_analyzer.start_exercise(frame)
             processed_frame = cv2.resize(processed_frame, (width, height))
@@ -65,12 +258,21 @@ def process_uploaded_video(input_video_bytes, exercise_analyzer):
 
         processed_video_bytes.seek(0)  # Reset BytesIO pointer
         print("Video processing complete.")
-        return {"success": True, "processed_video_bytes": processed_video_bytes, "frames_processed": frames_processed}
+        return {"success": True,
+                "processed_video_bytes": processed_video_bytes,
+                "frames_processed": frames_processed,
+                "analysis_fps": output_fps,
+                "session_summary": exercise_analyzer.get_session_summary(fps=output_fps)}
     except Exception as e:
         print(f"Error processing video: {e}")
         return {"success": False, "processed_video_bytes": None, "frames_processed": 0}
 
     finally:
+        if exercise_analyzer.sequence_length != sequence_length:
+            exercise_analyzer.set_sequence_length(sequence_length)
+        if exercise_analyzer.frame_step != 1:
+            exercise_analyzer.set_frame_step(1)
+
         # Cleanup temporary files
         if os.path.exists(input_temp_file):
             os.remove(input_temp_file)
@@ -0,0 +1,430 @@
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+
+# Number of frame slots in the shared memory ring of a worker
+RING_SLOTS = 2
+
+# Frame size the ring slots are allocated for, larger frames grow the ring
+DEFAULT_FRAME_SHAPE = (720, 1280, 3)
+
+
+def worker_main(shm_name, slot_size, slots, conn, analyzer_kwargs, tf_threads):
+    """
+    Entry point of a worker process, analyzing the frames of one session.
+
+    The frames arrive in the slots of the shared memory ring. The worker draws the overlays
+    in place and only sends a small result dictionary back through the pipe.
+
+    Args:
+        shm_name (str): Name of the shared memory block of the ring.
+        slot_size (int): Size of a ring slot in bytes.
+        slots (int): Number of ring slots.
+        conn (multiprocessing.connection.Connection): Pipe to the session.
+        analyzer_kwargs (dict): Keyword arguments of the ExerciseAnalyzer.
+        tf_threads (int): TensorFlow intra-op threads of the worker.
+    """
+    from trainer.governor import ResourceGovernor
+    ResourceGovernor(max_sessions=1, intra_op_threads=tf_threads).configure_tensorflow()
+    from trainer.exercise_analysis import ExerciseAnalyzer
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    analyzer = frame = processed_frame = None
+    try:
+        analyzer = ExerciseAnalyzer(**analyzer_kwargs)
+        conn.send(('ready', None))
+
+        while True:
+            message = conn.recv()
+            command = message[0]
+
+            if command == 'frame':
+                _, slot, shape, degradation_level = message
+                analyzer.apply_degradation(degradation_level)
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_size)
+                processed_frame = analyzer.start_exercise(frame)
+                if processed_frame is not frame:
+                    frame[:] = processed_frame
+                conn.send(('done', {
+                    'slot': slot,
+                    'exercise_id': analyzer.exercise_id if analyzer.exercise_data is not None else None,
+                    'reps': analyzer.rep_counter.get_count() if analyzer.exercise_data is not None else 0
+                }))
+            elif command == 'summary':
+                conn.send(('summary', analyzer.get_session_summary(fps=message[1])))
+            elif command == 'stop':
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if analyzer is not None:
+            analyzer.close()
+        # Release the views of the shared memory before closing it
+        frame = processed_frame = None
+        shm.close()
+
+
+class AnalysisWorker:
+    """
+    A class to run the analysis of one session in a separate worker process.
+
+    Moving the MediaPipe and Keras work out of the server process removes the GIL
+    contention between sessions and isolates crashes: a crashing or hanging worker is
+    restarted, and the session shows the unprocessed frame in the meantime. The frames are
+    not pickled, they are copied into a ring of shared memory slots, analyzed in place by
+    the worker, and read back from the same slot.
+
+    Attributes:
+        analyzer_kwargs (dict): Keyword arguments of the ExerciseAnalyzer in the worker.
+        timeout (float): Maximum processing time of a frame in seconds before the worker is restarted.
+        max_restarts (int): Number of restarts after which the worker is given up.
+        tf_threads (int): TensorFlow intra-op threads of the worker.
+        restarts (int): Number of restarts so far.
+        cpu_seconds_by_pid (dict): Last measured CPU time of every worker process started so far.
+        last_result (dict): Result of the last processed frame, with the exercise ID and the repetition count.
+    """
+    def __init__(self, analyzer_kwargs, frame_shape=DEFAULT_FRAME_SHAPE, slots=RING_SLOTS,
+                 timeout=5.0, max_restarts=3, tf_threads=1):
+        """
+        Initialize the AnalysisWorker and start its process.
+
+        Args:
+            analyzer_kwargs (dict): Keyword arguments of the ExerciseAnalyzer in the worker.
+            frame_shape (tuple): Frame shape the ring slots are allocated for. Default is 720p.
+            slots (int): Number of ring slots. Default is 2.
+            timeout (float): Maximum processing time of a frame in seconds. Default is 5.
+            max_restarts (int): Number of restarts after which the worker is given up. Default is 3.
+            tf_threads (int): TensorFlow intra-op threads of the worker. Default is 1.
+        """
+        self.analyzer_kwargs = analyzer_kwargs
+        self.slots = slots
+        self.timeout = timeout
+        self.max_restarts = max_restarts
+        self.tf_threads = tf_threads
+        self.restarts = 0
+        self.cpu_seconds_by_pid = {}
+        self.last_result = {'exercise_id': None, 'reps': 0}
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+        self.worker_process = None
+        self.shm = None
+        self.start(int(np.prod(frame_shape)))
+
+    def start(self, slot_size):
+        """
+        Allocate the shared memory ring and start the worker process.
+
+        Args:
+            slot_size (int): Size of a ring slot in bytes.
+        """
+        self.slot_size = slot_size
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_size * self.slots)
+        self.conn, worker_conn = self.context.Pipe()
+        self.worker_process = self.context.Process(target=worker_main,
+                                                   args=(self.shm.name, slot_size, self.slots, worker_conn,
+                                                         self.analyzer_kwargs, self.tf_threads),
+                                                   daemon=True)
+        self.worker_process.start()
+        worker_conn.close()
+        self.ready = False
+        self.next_slot = 0
+
+    def update_cpu_time(self):
+        """
+        Measure the CPU time of the current worker process, kept after the process is stopped or restarted.
+
+        Raises:
+            RuntimeError: If the CPU time of a running worker process cannot be read, e.g. without /proc.
+        """
+        if self.worker_process is None:
+            return
+        pid = self.worker_process.pid
+        try:
+            self.cpu_seconds_by_pid[pid] = get_process_cpu_seconds(pid)
+        except FileNotFoundError:
+            # An exited and reaped process keeps its last measured time
+            if pid not in self.cpu_seconds_by_pid or not os.path.isdir("/proc/self") or self.worker_process.is_alive():
+                raise RuntimeError(f"CPU time of worker process {pid} is not available")
+
+    def get_cpu_seconds(self):
+        """
+        Get the CPU time of all worker processes of this session, including replaced ones.
+
+        Returns:
+            float: CPU time in seconds.
+
+        Raises:
+            RuntimeError: If the CPU time of a running worker process cannot be read, e.g. without /proc.
+        """
+        with self.lock:
+            self.update_cpu_time()
+            return sum(self.cpu_seconds_by_pid.values())
+
+    def stop(self):
+        """
+        Stop the worker process and free the shared memory ring.
+        """
+        if self.worker_process is not None:
+            try:
+                self.update_cpu_time()
+            except RuntimeError:
+                pass
+            try:
+                self.conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+            self.worker_process.join(timeout=1)
+            if self.worker_process.is_alive():
+                self.worker_process.terminate()
+                self.worker_process.join()
+            self.conn.close()
+            self.worker_process = None
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                # A returned frame still uses the ring, the memory is freed with its last view
+                pass
+            self.shm.unlink()
+            self.shm = None
+
+    def restart(self, reason):
+        """
+        Replace a crashed or hanging worker process with a new one, up to max_restarts times.
+
+        Args:
+            reason (str): Reason of the restart for the log.
+        """
+        print(f"Restarting analysis worker: {reason}")
+        self.stop()
+        self.restarts += 1
+        if self.restarts <= self.max_restarts:
+            self.start(self.slot_size)
+
+    def is_ready(self):
+        """
+        Check if the worker finished loading its analyzer, without blocking.
+
+        Returns:
+            bool: True if the worker accepts frames.
+        """
+        if not self.ready and self.worker_process is not None and self.conn.poll(0):
+            try:
+                self.ready = self.conn.recv()[0] == 'ready'
+            except EOFError:
+                self.restart("worker exited during startup")
+        return self.ready
+
+    def process(self, frame, degradation_level=0):
+        """
+        Analyze a frame in the worker process.
+
+        Args:
+            frame (np.ndarray): A single BGR video frame.
+            degradation_level (int): Degradation level of the resource governor the worker applies. Default is 0.
+
+        Returns:
+            np.ndarray: The processed frame. It is a view of a ring slot and only valid until
+                the slot is reused, `slots - 1` frames later.
+        """
+        with self.lock:
+            if self.worker_process is None:
+                cv2.putText(frame, "Analysis not available", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                return frame
+            if frame.nbytes > self.slot_size:
+                # Grow the ring, the worker loads its analyzer again
+                self.stop()
+                self.start(frame.nbytes)
+                return frame
+            if not self.is_ready():
+                if not self.worker_process.is_alive():
+                    self.restart(f"worker exited with code {self.worker_process.exitcode}")
+                cv2.putText(frame, "Loading analysis...", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+                return frame
+
+            slot = self.next_slot
+            self.next_slot = (slot + 1) % self.slots
+            shared_frame = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_size)
+            shared_frame[:] = frame
+
+            try:
+                self.conn.send(('frame', slot, frame.shape, degradation_level))
+                if not self.conn.poll(self.timeout):
+                    self.restart(f"no result within {self.timeout} seconds")
+                    return frame
+                _, result = self.conn.recv()
+            except (EOFError, BrokenPipeError, OSError):
+                # Measure the CPU time of the crashed process before it is reaped
+                try:
+                    self.update_cpu_time()
+                except RuntimeError:
+                    pass
+                self.worker_process.join(timeout=1)
+                self.restart(f"worker crashed with code {self.worker_process.exitcode}")
+                return frame
+
+            self.last_result = result
+            return shared_frame
+
+    def get_session_summary(self, fps=30.0):
+        """
+        Get the session summary of the analyzer in the worker.
+
+        Args:
+            fps (float): Frame rate of the analyzed video. Default is 30.
+
+        Returns:
+            dict: The session summary of SessionAnalytics, None if not available.
+        """
+        with self.lock:
+            if self.worker_process is None or not self.is_ready():
+                return None
+            try:
+                self.conn.send(('summary', fps))
+                if self.conn.poll(self.timeout):
+                    return self.conn.recv()[1]
+            except (EOFError, BrokenPipeError, OSError):
+                pass
+            return None
+
+    def close(self):
+        """
+        Stop the worker process and free the shared memory ring.
+        """
+        with self.lock:
+            self.stop()
+
+
+def get_process_cpu_seconds(pid):
+    """
+    Get the CPU time (user and system) a process has used so far, from /proc.
+
+    Args:
+        pid (int): ID of the process.
+
+    Returns:
+        float: CPU time in seconds.
+
+    Raises:
+        FileNotFoundError: If /proc is not available or the process does not exist anymore.
+    """
+    with open(f"/proc/{pid}/stat") as f:
+        # The command name may contain spaces, the fields after it are space-separated
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are the 14th and 15th field of the line, in clock ticks
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def benchmark_worker_mode(analyzer_kwargs, frames, session_counts, frames_per_session=150):
+    """
+    Measure the throughput of concurrent sessions analyzed in-process and in worker processes.
+
+    Every session runs in its own thread and processes the looped frames as fast as possible.
+    The CPU time used during the run is measured for the server process and all worker
+    processes, including replaced ones, so the throughput per core compares the modes on the
+    CPU they actually used. Where the CPU time of the workers cannot be measured (no /proc),
+    the cores used and the throughput per core of the worker mode are None.
+
+    Args:
+        analyzer_kwargs (dict): Keyword arguments of the ExerciseAnalyzer of every session.
+        frames (list): Frames of the test clip, looped by every session.
+        session_counts (list): Numbers of concurrent sessions to test.
+        frames_per_session (int): Number of frames processed by every session. Default is 150.
+
+    Returns:
+        list: A dictionary per mode and session count with the total fps, the cores used
+            (CPU seconds per wall-clock second) and the fps per core used.
+    """
+    from trainer.exercise_analysis import ExerciseAnalyzer
+
+    report = []
+    for mode in ('in-process', 'worker'):
+        for session_count in session_counts:
+            if mode == 'worker':
+                sessions = [AnalysisWorker(analyzer_kwargs, frame_shape=frames[0].shape, timeout=60) for _ in range(session_count)]
+                while not all(session.is_ready() for session in sessions):
+                    time.sleep(0.1)
+                process_frame = lambda session, frame: session.process(frame)
+            else:
+                sessions = [ExerciseAnalyzer(**analyzer_kwargs) for _ in range(session_count)]
+                process_frame = lambda session, frame: session.start_exercise(frame)
+
+            def run_session(session):
+                for i in range(frames_per_session):
+                    process_frame(session, frames[i % len(frames)].copy())
+
+            def get_cpu_seconds():
+                cpu_seconds = time.process_time()
+                if mode == 'worker':
+                    try:
+                        cpu_seconds += sum(session.get_cpu_seconds() for session in sessions)
+                    except RuntimeError as e:
+                        print(f"Error measuring the CPU time of the workers: {e}")
+                        return None
+                return cpu_seconds
+
+            threads = [threading.Thread(target=run_session, args=(session,)) for session in sessions]
+            start_cpu = get_cpu_seconds()
+            start_time = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - start_time
+            end_cpu = get_cpu_seconds()
+            cores_used = (end_cpu - start_cpu) / seconds if start_cpu is not None and end_cpu is not None else None
+            fps = session_count * frames_per_session / seconds
+
+            if mode == 'worker':
+                for session in sessions:
+                    session.close()
+
+            report.append({'mode': mode,
+                           'sessions': session_count,
+                           'fps': fps,
+                           'cores_used': cores_used,
+                           'fps_per_core': fps / cores_used if cores_used else None})
+    return report
+
+
+def main(argv=None):
+    """
+    Command-line entry point for the benchmark of the worker mode.
+
+    Args:
+        argv (list): Command-line arguments. Default is sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Compare the throughput of in-process and worker-process analysis.")
+    parser.add_argument("video", help="Test clip, looped by every session")
+    parser.add_argument("--api-endpoint", required=True, help="Model download endpoint")
+    parser.add_argument("--exercise-id", type=int, default=1)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--frames", type=int, default=150, help="Frames per session")
+    args = parser.parse_args(argv)
+
+    frames = []
+    cap = cv2.VideoCapture(args.video)
+    while len(frames) < 300:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    analyzer_kwargs = {'exercise_id': args.exercise_id, 'api_endpoint': args.api_endpoint}
+    report = benchmark_worker_mode(analyzer_kwargs, frames, args.sessions, frames_per_session=args.frames)
+
+    print("mode        sessions       fps     cores  fps/core")
+    for row in report:
+        cores_used = f"{row['cores_used']:>8.2f}" if row['cores_used'] is not None else f"{'n/a':>8}"
+        fps_per_core = f"{row['fps_per_core']:>8.1f}" if row['fps_per_core'] is not None else f"{'n/a':>8}"
+        print(f"{row['mode']:<10}  {row['sessions']:>8}  {row['fps']:>8.1f}  {cores_used}  {fps_per_core}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from streamlit_webrtc import VideoTransformerBase
-from trainer.exercise_analysis import ExerciseAnalyzer
+from trainer.exercise_analysis import ExerciseAnalyzer, DEGRADATION_CHECK_INTERVAL
+from trainer.worker import AnalysisWorker
+import time
 import cv2
 import av
 
@@ -16,18 +18,85 @@ class VideoProcessor(VideoTransformerBase):
                  error_threshold,
                  visibility_threshold,
                  api_endpoint,
-                 sequence_length):
+                 sequence_length,
+                 prediction_stride=1,
+                 adaptive_stride=False,
+                 incremental_inference=False,
+                 recording_path=None,
+                 governor=None,
+                 queue_timeout=0,
+                 use_worker_process=False):
         print(f"Initializing VideoProcessor with exercise_id: {exercise_id}")
-        self.exercise = ExerciseAnalyzer(exercise_id=exercise_id,
-                                            draw_predicted_lm=draw_predicted_lm,
-                                            error_threshold=error_threshold,
-                                            visibility_threshold=visibility_threshold,
-                                            api_endpoint=api_endpoint,
-                                            sequence_length=sequence_length
-                                        )
+        self.exercise = None
+        self.worker = None
+        self.governor = governor
+        self.degradation_level = 0
+        self.frames_processed = 0
+
+        # Wait for a free session slot, a rejected session only shows a busy message
+        self.admitted = governor.acquire_session(timeout=queue_timeout) if governor else True
+        if not self.admitted:
+            print("All analysis sessions are in use, rejecting the session")
+            return
+
+        analyzer_kwargs = dict(exercise_id=exercise_id,
+                               draw_predicted_lm=draw_predicted_lm,
+                               error_threshold=error_threshold,
+                               visibility_threshold=visibility_threshold,
+                               api_endpoint=api_endpoint,
+                               sequence_length=sequence_length,
+                               prediction_stride=prediction_stride,
+                               adaptive_stride=adaptive_stride,
+                               incremental_inference=incremental_inference,
+                               recording_path=recording_path)
+
+        # Analyze in a separate worker process, or in the server process sharing its CPU budget
+        try:
+            if use_worker_process:
+                self.worker = AnalysisWorker(analyzer_kwargs)
+            else:
+                self.exercise = ExerciseAnalyzer(**analyzer_kwargs, governor=governor)
+        except Exception:
+            # Free the slot of a session that could not be started, e.g. if the model download failed
+            if governor is not None:
+                governor.release_session()
+            self.admitted = False
+            raise
 
     def recv(self, frame):
         frame = frame.to_ndarray(format="bgr24")
         frame = cv2.flip(frame, 1)
-        processed_frame = self.exercise.start_exercise(frame)
+        if not self.admitted:
+            cv2.putText(frame, "Server busy, please try again later", (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            return av.VideoFrame.from_ndarray(frame, format="bgr24")
+        if self.worker is not None:
+            # The result is a view of the shared memory ring, from_ndarray copies it
+            start_time = time.perf_counter()
+            processed_frame = self.worker.process(frame, degradation_level=self.degradation_level)
+
+            # The worker has no governor, report its latency and follow the degradation level here
+            if self.governor is not None and self.worker.ready:
+                self.governor.record_latency(time.perf_counter() - start_time)
+                self.frames_processed += 1
+                if self.frames_processed % DEGRADATION_CHECK_INTERVAL == 0:
+                    self.degradation_level = self.governor.get_degradation_level()
+        else:
+            processed_frame = self.exercise.start_exercise(frame)
         return av.VideoFrame.from_ndarray(processed_frame, format="bgr24")
+
+    def get_session_summary(self):
+        if self.worker is not None:
+            return self.worker.get_session_summary()
+        if self.exercise is not None:
+            return self.exercise.get_session_summary()
+        return None
+
+    def on_ended(self):
+        # Stop the worker process, close the analyzer and free the session slot when the stream ends
+        if self.worker is not None:
+            self.worker.close()
+        if self.exercise is not None:
+            self.exercise.close()
+        if self.governor is not None and self.admitted:
+            self.governor.release_session()
+            self.admitted = False